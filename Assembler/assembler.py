@@ -0,0 +1,18 @@
+# library entry point. Everything an assembly needs lives in its own Generator, so assemble()
+# can be called any number of times in one process
+
+from lexer import LEXERS
+from gen import Generator
+from image import Image
+
+
+def assemble(source, origin=0, bank=0, lexer="stream", optimize=False):
+    # the Image of a .16bs source placed at origin, its labels are in image.symbols
+    generator = Generator(LEXERS[lexer](source).Lex(), origin, optimize=optimize)
+    generator.Gen()
+    return Image.from_generator(generator, bank)
+
+
+def assemble_file(path, origin=0, bank=0, lexer="stream", optimize=False):
+    with open(path, "r") as f:
+        return assemble(f.read(), origin, bank, lexer, optimize)
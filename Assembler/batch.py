@@ -0,0 +1,90 @@
+# assembles many files in one go, spread over a pool of processes. Results are reported in the
+# order of the inputs no matter which worker finishes first
+# usage: python Assembler/batch.py a.16bs b.16bs ... [--output-dir out] [--jobs 4]
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from assembler import assemble_file
+from cache import Cache, DEFAULT_SIZE
+from image import FORMATS
+
+EXTENSIONS = {"bin": ".bin", "banks": ".bin", "ihex": ".hex", "c": ".h"}
+
+# (cache directory, size limit) -> Cache, one per worker process so its size is only counted once
+CACHES = {}
+
+
+def output_path(path, output_dir, format):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, stem + EXTENSIONS[format])
+
+
+def build(job):
+    # (input, output, image size, error message or None, cache hit or None without a cache)
+    path, output, origin, bank, format, optimize, cache_dir, cache_size = job
+    hit = None
+    try:
+        if cache_dir:
+            cache = CACHES.get((cache_dir, cache_size))
+            if cache is None:
+                cache = CACHES[cache_dir, cache_size] = Cache(cache_dir, cache_size)
+            hits = cache.hits
+            with open(path, "r") as f:
+                image = cache.assemble(f.read(), origin, bank, optimize)
+            hit = cache.hits > hits
+        else:
+            image = assemble_file(path, origin, bank, optimize=optimize)
+        image.write(output, format)
+        return path, output, len(image.data), None, hit
+    except Exception as e:
+        return path, output, 0, str(e), hit
+
+
+def build_all(paths, output_dir, origin=0, bank=0, format="bin", optimize=False, jobs=None, cache_dir=None, cache_size=DEFAULT_SIZE):
+    outputs = [output_path(path, output_dir, format) for path in paths]
+    if len(set(outputs)) != len(outputs):
+        raise Exception("Two inputs would be written to the same output file, give them different names")
+
+    work = [(path, output, origin, bank, format, optimize, cache_dir, cache_size) for path, output in zip(paths, outputs)]
+    if jobs == 1:
+        return [build(job) for job in work]
+    with ProcessPoolExecutor(jobs) as pool:
+        # map keeps the input order, chunks keep the per task overhead down for many small files
+        return list(pool.map(build, work, chunksize=max(1, len(work) // (4 * (jobs or os.cpu_count() or 1)))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--output-dir", type=str, default=".")
+    parser.add_argument("--offset", type=str, default="0x0")
+    parser.add_argument("--bank", type=int, default=0)
+    parser.add_argument("--format", type=str, choices=FORMATS, default="bin")
+    parser.add_argument("--optimize", action="store_true")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes, defaults to the number of cpus. 1 runs everything in this process")
+    parser.add_argument("--quiet", action="store_true", help="only print errors")
+    parser.add_argument("--cache-dir", type=str, help="reuse images assembled before from the same source and options")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_SIZE >> 20, help="size limit of the cache in MB")
+
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    results = build_all(args.inputs, args.output_dir, int(args.offset, base=16), args.bank, args.format, args.optimize, args.jobs,
+                        args.cache_dir, args.cache_size << 20)
+
+    failed = 0
+    for path, output, size, error, hit in results:
+        if error is not None:
+            failed += 1
+            print("{}: {}".format(path, error), file=sys.stderr)
+        elif not args.quiet:
+            print("{} -> {} ({} bytes{})".format(path, output, size, ", cached" if hit else ""))
+
+    if args.cache_dir:
+        hits = sum(1 for result in results if result[4])
+        print("cache: {} hits, {} misses".format(hits, sum(1 for result in results if result[4] is False)), file=sys.stderr)
+
+    sys.exit(1 if failed else 0)
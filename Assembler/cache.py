@@ -0,0 +1,121 @@
+# on disk cache of assembled images. An entry is found by the sha256 of the assembler version,
+# the placement, the options and the source text, so a hit never lexes or generates anything.
+# Entries are touched on every hit and the least recently used ones are removed once the cache
+# grows past its size limit
+
+import hashlib
+import json
+import os
+import tempfile
+
+from assembler import assemble
+from image import Image
+
+# the assembler version is the hash of the code that decides what an image looks like
+VERSION_FILES = ("lexer.py", "isa.py", "gen.py", "optimize.py", "image.py", "cache.py")
+DEFAULT_SIZE = 64 << 20
+SUFFIX = ".img"
+
+
+def assembler_version():
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in VERSION_FILES:
+        with open(os.path.join(directory, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+VERSION = assembler_version()
+
+
+class Cache:
+    def __init__(self, directory, max_size=DEFAULT_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bytes in the cache, counted on the first store and kept up to date by this process only
+        self.size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, origin, bank, optimize):
+        digest = hashlib.sha256()
+        digest.update("{}\0{}\0{}\0{}\0".format(VERSION, origin, bank, int(optimize)).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, source, origin=0, bank=0, optimize=False):
+        # the cached Image or None
+        path = self.path(self.key(source, origin, bank, optimize))
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                data = bytearray(f.read())
+            os.utime(path)
+        except (OSError, ValueError):
+            # missing, evicted by another process meanwhile or unreadable
+            self.misses += 1
+            return None
+        self.hits += 1
+        return Image(header["origin"], data, header["bank"], header["symbols"])
+
+    def put(self, source, origin, bank, optimize, image):
+        path = self.path(self.key(source, origin, bank, optimize))
+        header = json.dumps({"origin": image.origin, "bank": image.bank, "symbols": image.symbols}).encode()
+        # written under a temporary name first so concurrent builds never read half an entry
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(header + b"\n")
+            f.write(image.data)
+        os.replace(temporary, path)
+
+        if self.size is None:
+            self.size = self.scan()[1]
+        else:
+            self.size += len(header) + 1 + len(image.data)
+        if self.size > self.max_size:
+            self.evict()
+
+    def assemble(self, source, origin=0, bank=0, optimize=False):
+        image = self.get(source, origin, bank, optimize)
+        if image is None:
+            image = assemble(source, origin, bank, optimize=optimize)
+            self.put(source, origin, bank, optimize, image)
+        return image
+
+    def scan(self):
+        # ([(last use, path, size)], total size) of all entries
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+                total += stat.st_size
+        return entries, total
+
+    def evict(self):
+        # removes the least recently used entries until the cache fits into max_size
+        entries, total = self.scan()
+        entries.sort()
+        for _, path, size in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+    def stats(self):
+        return "cache: {} hits, {} misses, {} evicted".format(self.hits, self.misses, self.evictions)
@@ -0,0 +1,210 @@
+# disassembler for the images main.py writes. The whole image is decoded at once through a big
+# endian word view, jump targets get labels (from a symbol map or generated ones like l0010) and
+# everything that is not a valid encoding is kept as db, so the listing assembles back into the
+# same bytes. Words are decoded 4 byte aligned from the origin and from every label
+# usage: python Assembler/disasm.py a.bin [a.bank01.bin ...] [--origin 0x0] [--symbols a.sym] [--check]
+
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+from assembler import assemble
+from isa import INSTRUCTIONS, REGISTERS, REG1, REG2, IMM16, IMM
+from image import BANK_START, read_symbols
+
+# opcode -> (mnemonic, slot of every operand)
+FORMS = {opcode: (mnemonic, slots) for mnemonic, forms in INSTRUCTIONS.items() for opcode, slots in forms.values()}
+# jumps to an imm16, their targets get labels
+JUMPS = sorted(opcode for mnemonic, forms in INSTRUCTIONS.items() for kinds, (opcode, _) in forms.items() if mnemonic[0] == "j" and kinds == (IMM,))
+# opcodes whose imm16 is an address, they are symbolized in the comment
+ADDRESSES = JUMPS + [INSTRUCTIONS["ldr"]["reg", IMM][0], INSTRUCTIONS["wtr"]["reg", IMM][0]]
+
+REGISTER_NAMES = {number: name for name, number in REGISTERS.items()}
+SLOT_BITS = {REG1: 0xF << REG1, REG2: 0xF << REG2, IMM16: 0xFFFF}
+
+# opcode -> bits an encoding of it may set, 0 for opcodes that do not exist
+USED_BITS = np.zeros(256, np.uint32)
+for opcode, (_, slots) in FORMS.items():
+    USED_BITS[opcode] = 0xFF << 24 | sum(SLOT_BITS[slot] for slot in slots)
+KNOWN_REGISTERS = np.zeros(16, bool)
+KNOWN_REGISTERS[list(REGISTER_NAMES)] = True
+JUMP_SET = frozenset(JUMPS)
+IS_JUMP = np.zeros(256, bool)
+IS_JUMP[JUMPS] = True
+IS_ADDRESS = np.zeros(256, bool)
+IS_ADDRESS[ADDRESSES] = True
+
+BYTES = ["0x{:02x}".format(byte) for byte in range(256)]
+# instruction column of a listing line, the address and symbol follow in a comment
+COLUMN = "{:<27} ; "
+BANK_NAME = re.compile(r"\.bank[0-9a-f]{2}(\.[^.]*)?$")
+
+
+def decode(data):
+    # (opcode, reg1, reg2, imm16, valid) of every aligned word of data. imm16 is stored byte
+    # swapped (see swap16), valid words encode back into exactly the same bits
+    words = np.frombuffer(data, dtype=">u4", count=len(data) // 4).astype(np.uint32)
+    opcode = words >> 24
+    reg1 = words >> REG1 & 0xF
+    reg2 = words >> REG2 & 0xF
+    imm16 = (words & 0xFF) << 8 | (words >> 8 & 0xFF)
+    used = USED_BITS[opcode]
+    valid = (used != 0) & (words & ~used == 0) & KNOWN_REGISTERS[reg1] & KNOWN_REGISTERS[reg2]
+    return opcode, reg1, reg2, imm16, valid
+
+
+class Symbolizer:
+    def __init__(self, symbols=()) -> None:
+        # sorted (address, name), several names may share an address
+        self.symbols = sorted(symbols)
+        self.addresses = np.array([address for address, _ in self.symbols], dtype=np.int64)
+
+    def lookup(self, addresses):
+        # index of the symbol at or before every address, -1 before the first one
+        return np.searchsorted(self.addresses, addresses, side="right") - 1
+
+    def describe(self, address, index):
+        # name or name+offset of address given its lookup() index, None without a symbol before it
+        if index < 0:
+            return None
+        symbol_address, name = self.symbols[index]
+        return name if symbol_address == address else "{}+0x{:x}".format(name, address - symbol_address)
+
+
+def labels(data, origin, decoded, symbols=()):
+    # address -> [label names] of everything inside the image: the symbols and a generated
+    # label for every jump target without one
+    end = origin + len(data)
+    names = {}
+    for address, name in symbols:
+        if origin <= address <= end:
+            names.setdefault(address, []).append(name)
+
+    taken = set(name for _, name in symbols)
+    opcode, _, _, imm16, valid = decoded
+    targets = np.unique(imm16[valid & IS_JUMP[opcode]])
+    for target in targets[(targets >= origin) & (targets <= end)].tolist():
+        name = "l{:04x}".format(target)
+        if target not in names and name not in taken:
+            names[target] = [name]
+    return names
+
+
+def disassemble(data, origin=0, symbols=()):
+    # the lines of a source that assembles into data at origin. Every label starts a new run of
+    # words in its own alignment, so code behind odd sized data decodes once a label marks it
+    decoded = decode(data)
+    names = labels(data, origin, decoded, symbols)
+    symbolizer = Symbolizer(symbols)
+
+    # phase -> the decoded words starting at that byte as lists, only made for phases a label uses
+    columns = {}
+
+    def column(phase):
+        if phase not in columns:
+            opcode, reg1, reg2, imm16, valid = decode(data[phase:]) if phase else decoded
+            addresses = IS_ADDRESS[opcode] & valid
+            found = symbolizer.lookup(np.where(addresses, imm16, -1))
+            words = np.frombuffer(data[phase:], dtype=">u4", count=len(opcode))
+            columns[phase] = [array.tolist() for array in (words, opcode, reg1, reg2, imm16, valid, addresses, found)]
+        return columns[phase]
+
+    # word -> instruction text, images repeat a lot of words (padding, tables, loops)
+    texts = {}
+    lines = []
+    starts = sorted(set([0] + [address - origin for address in names if address - origin < len(data)]))
+    for start, end in zip(starts, starts[1:] + [len(data)]):
+        if origin + start in names:
+            lines += [name + ":" for name in names[origin + start]]
+        words, opcode, reg1, reg2, imm16, valid, addresses, found = column(start & 3)
+        pending = start
+        for i in range(start >> 2, (end - (start & 3)) >> 2):
+            offset = (start & 3) + 4 * i
+            if not valid[i]:
+                continue
+            if pending < offset:
+                lines += data_lines(data, origin, pending, offset)
+            pending = offset + 4
+
+            text = texts.get(words[i])
+            if text is None:
+                mnemonic, slots = FORMS[opcode[i]]
+                operands = []
+                for slot in slots:
+                    if slot == REG1:
+                        operands.append(REGISTER_NAMES[reg1[i]])
+                    elif slot == REG2:
+                        operands.append(REGISTER_NAMES[reg2[i]])
+                    elif imm16[i] in names and opcode[i] in JUMP_SET:
+                        operands.append(names[imm16[i]][0])
+                    else:
+                        operands.append("0x{:04x}".format(imm16[i]))
+                text = texts[words[i]] = COLUMN.format("    " + mnemonic + (" " + ", ".join(operands) if operands else "")) + "0x%04x"
+
+            symbol = symbolizer.describe(imm16[i], found[i]) if addresses[i] else None
+            if symbol is not None and not (opcode[i] in JUMP_SET and imm16[i] in names):
+                lines.append(text % (origin + offset) + " " + symbol)
+            else:
+                lines.append(text % (origin + offset))
+        if pending < end:
+            lines += data_lines(data, origin, pending, end)
+
+    if origin + len(data) in names:
+        lines += [name + ":" for name in names[origin + len(data)]]
+    return lines
+
+
+def data_lines(data, origin, start, end):
+    # bytes that are no instruction, 16 per db
+    return [COLUMN.format("    db " + ", ".join(map(BYTES.__getitem__, data[offset:min(offset + 16, end)]))) + "0x{:04x}".format(origin + offset)
+            for offset in range(start, end, 16)]
+
+
+def check(data, origin, lines, symbols=()):
+    # assembles the listing again, raises if the bytes or a label inside the image differ
+    image = assemble("\n".join(lines), origin)
+    if bytes(image.data) != bytes(data):
+        mismatch = next((i for i in range(min(len(data), len(image.data))) if data[i] != image.data[i]), min(len(data), len(image.data)))
+        raise Exception("Disassembly does not assemble back into the image, first difference at " + hex(origin + mismatch))
+    for address, name in symbols:
+        if origin <= address <= origin + len(data) and image.symbols.get(name) != address:
+            raise Exception("Label " + name + " moved from " + hex(address) + " in the disassembly")
+
+
+def default_origin(path):
+    # bank images written by --format banks live in the bank window, everything else at 0
+    return BANK_START if BANK_NAME.search(os.path.basename(path)) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="+")
+    parser.add_argument("--origin", type=str, help="address of the first byte, defaults to 0xc000 for .bankNN images and 0 otherwise")
+    parser.add_argument("--symbols", type=str, help="symbol map written by main.py --symbols")
+    parser.add_argument("--check", action="store_true", help="assemble the disassembly again and compare it with the image")
+    parser.add_argument("--quiet", action="store_true", help="do not print the listing")
+
+    args = parser.parse_args()
+
+    symbols = read_symbols(args.symbols) if args.symbols else []
+    failed = False
+    for path in args.inputs:
+        with open(path, "rb") as f:
+            data = f.read()
+        origin = int(args.origin, base=16) if args.origin else default_origin(path)
+        lines = disassemble(data, origin, symbols)
+        if not args.quiet:
+            if len(args.inputs) > 1:
+                print("; " + path)
+            print("\n".join(lines))
+        if args.check:
+            try:
+                check(data, origin, lines, symbols)
+            except Exception as e:
+                failed = True
+                print("{}: {}".format(path, e), file=sys.stderr)
+
+    sys.exit(1 if failed else 0)
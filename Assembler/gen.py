@@ -1,307 +1,257 @@
-from psutil import swap_memory
+from array import array
 from lexer import TokenTypes
 from lexer import Token
-
-OPCODE_MAP = {"nop": 0x00, "mov": 0x01, "lod": 0x02, "out": 0x03, "inp": 0x04, 
-              "jnz": 0x05, "add": 0x07, "sub": 0x09, "nad": 0x0b, "nor": 0x0d,
-              "cmp": 0x0f, "jzr": 0x11, "ldr": 0x13, "wtr": 0x15, "swp": 0x17,
-              "jmp": 0x18, "jeq": 0x1a, "jnq": 0x1c}
-REGISTERS = {"r0": 0x00, "r1": 0x01, "r2": 0x02, "sp": 0x12}
-LABELS = {}
+from isa import INSTRUCTIONS, ARITY, OPCODE_MAP, REGISTERS, REG, IMM, encode, swap16
+from optimize import LABEL, INSTRUCTION, DATA, optimize, size
 
 
 class Generator:
-    def __init__(self, tokens, ep=0x0) -> None:
+    def __init__(self, tokens, ep=0x0, listing=False, optimize=False) -> None:
         self.ep = ep
         self.instruction_counter = 0
         self.final_text = []
-        
+        # size in bytes of every item in final_text
+        self.sizes = array("B")
+        # (index into final_text, label name, width in bits) for labels used before their definition
+        self.fixups = []
+        # (address, index into final_text, directive) of every emitted item, only kept if a listing is requested
+        self.listing = [] if listing else None
+        # label name -> address of the labels defined in this source
+        self.labels = {}
+        # parsed statements (see optimize.py) when optimizing, otherwise everything is encoded while parsing
+        self.statements = [] if optimize else None
+        # (instructions, bytes) before and after optimizing
+        self.optimized = None
+
         self.tokens = tokens
+        self.token_count = len(tokens)
         self.pos = -1
         self.current_token: Token = None
-        self.in_check_label = False
         self.advance()
-        self.check_label()
 
-    def check_label(self):
-        self.in_check_label = True
-        self.Gen()
-        self.pos = -1
-        self.current_token = None
-        self.in_check_label = False
-        self.instruction_counter = 0
-        self.final_text = []
-        self.advance()
+    def get_label(self, name, bits):
+        if name in self.labels:
+            return self.label_value(name, self.labels[name], bits)
+
+        # not defined yet, the word that is emitted next gets patched in resolve_fixups()
+        self.fixups.append((len(self.final_text), name, bits))
+        return 0
+
+    def label_value(self, name, address, bits):
+        if bits == 16:
+            if address > 65535:
+                raise Exception("Label: " + name + " (" + hex(address) + ") is bigger than 2bytes (65535)")
+            return swap16(address)
+        else:
+            if address > 255:
+                raise Exception("Label: " + name + " (" + hex(address) + ") is bigger than a byte (255)")
+            return address
+
+    def resolve_fixups(self):
+        for index, name, bits in self.fixups:
+            if name not in self.labels:
+                raise Exception("Invalid label: " + name)
+            self.final_text[index] |= self.label_value(name, self.labels[name], bits)
+        self.fixups = []
+
+    def get_number(self):
+        if self.current_token.type == TokenTypes.DECIMAL_IMM16:
+            return int(self.current_token.value)
+        return int(self.current_token.value, base=0)
 
     def get_imm16(self):
-        if self.current_token.type in (TokenTypes.BINARY_IMM16, TokenTypes.DECIMAL_IMM16, TokenTypes.HEXADECIMAL_IMM16, TokenTypes.ID):
-            if self.current_token.type == TokenTypes.BINARY_IMM16:
-                if int(self.current_token.value, base=0) > 65535:
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than 2bytes (65535)")
-                i = int(self.current_token.value, base=0)
-                i = (i & 0xFF) << 8 | (i & 0xFF00) >> 8
-                return i
-            elif self.current_token.type == TokenTypes.DECIMAL_IMM16:
-                if int(self.current_token.value) > 65535:
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than 2bytes (65535)")
-                i = int(self.current_token.value)
-                i = (i & 0xFF) << 8 | (i & 0xFF00) >> 8
-                return i
-            elif self.current_token.type == TokenTypes.ID:
-                if self.in_check_label:
-                    return 0
-                if self.current_token.value in LABELS.keys():
-                    if int(LABELS[self.current_token.value], base=16) > 65535:
-                        raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than 2bytes (65535)")
-                    i = int(LABELS[self.current_token.value], base=16)
-                    i = (i & 0xFF) << 8 | (i & 0xFF00) >> 8
-                    return i
-                else:
-                    raise Exception("Invalid label")
-            else:
-                if int(self.current_token.value, base=16) > 65535:                    
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than 2bytes (65535)")
-                i = int(self.current_token.value, base=16)
-                i = (i & 0xFF) << 8 | (i & 0xFF00) >> 8
-                return i
+        if self.current_token == None:
+            raise Exception("Imm16 was expected but not found")
+        elif self.current_token.type == TokenTypes.ID:
+            return self.get_label(self.current_token.value, 16)
+        elif self.current_token.type in (TokenTypes.BINARY_IMM16, TokenTypes.DECIMAL_IMM16, TokenTypes.HEXADECIMAL_IMM16):
+            return self.number_value(self.get_number(), 16)
         else:
             raise Exception("Imm16 was expected but not found")
 
     def get_imm8(self):
-        if self.current_token.type in (TokenTypes.BINARY_IMM16, TokenTypes.DECIMAL_IMM16, TokenTypes.HEXADECIMAL_IMM16, TokenTypes.ID):
-            if self.current_token.type == TokenTypes.BINARY_IMM16:
-                if int(self.current_token.value, base=0) > 255:
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than a byte (255)")
-                return int(self.current_token.value, base=0)
-            elif self.current_token.type == TokenTypes.DECIMAL_IMM16:
-                if int(self.current_token.value) > 255:
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than a byte (255)")
-                return int(self.current_token.value)
-            elif self.current_token.type == TokenTypes.ID:
-                if self.in_check_label:
-                    return 0
-                if self.current_token.value in LABELS.keys():
-                    if int(LABELS[self.current_token.value], base=16) > 255:
-                        raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than a byte (255)")
-                    return int(LABELS[self.current_token.value], base=16)
-                else:
-                    raise Exception("Invalid label")
-            else:
-                if int(self.current_token.value, base=16) > 255:                    
-                    raise Exception("Number: " + str(int(self.current_token.value, base=0)) + " is bigger than a byte (255)")
-                return int(self.current_token.value, base=16)
+        if self.current_token == None:
+            raise Exception("Imm8 was expected but not found")
+        elif self.current_token.type == TokenTypes.ID:
+            return self.get_label(self.current_token.value, 8)
+        elif self.current_token.type in (TokenTypes.BINARY_IMM16, TokenTypes.DECIMAL_IMM16, TokenTypes.HEXADECIMAL_IMM16):
+            return self.number_value(self.get_number(), 8)
         else:
             raise Exception("Imm8 was expected but not found")
 
-    def make_instruction(self, opcode=0, register1="r0", register2="r0", imm16=0):
-        i = "0x{:02x} ".format(opcode) + "{:01x} ".format(REGISTERS[register2]) + "{:01x} ".format(REGISTERS[register1]) + "{:04x} ".format(imm16)
-        print(i)
-        return "0x{:02x}".format(opcode) + "{:01x}".format(REGISTERS[register2]) + "{:01x}".format(REGISTERS[register1]) + "{:04x}".format(imm16)
+    def number_value(self, i, bits):
+        if bits == 16:
+            if i > 65535:
+                raise Exception("Number: " + str(i) + " is bigger than 2bytes (65535)")
+            return swap16(i)
+        if i > 255:
+            raise Exception("Number: " + str(i) + " is bigger than a byte (255)")
+        return i
+
+    def value(self, raw, bits):
+        # encoded value of a parsed number or label name
+        if isinstance(raw, str):
+            return self.get_label(raw, bits)
+        return self.number_value(raw, bits)
+
+    def get_raw(self, expected):
+        # the current number or id without resolving it, for the optimizer
+        if self.current_token != None and self.current_token.type == TokenTypes.ID:
+            return self.current_token.value
+        elif self.current_token != None and self.current_token.type in (TokenTypes.BINARY_IMM16, TokenTypes.DECIMAL_IMM16, TokenTypes.HEXADECIMAL_IMM16):
+            return self.get_number()
+        raise Exception(expected + " was expected but not found")
+
+    def get_operand(self):
+        # returns (kind, value). Ids naming a register are registers, everything else is an imm16
+        if self.current_token != None and self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS:
+            return REG, REGISTERS[self.current_token.value]
+        return IMM, self.get_imm16()
+
+    def emit(self, value, size, directive):
+        if self.listing != None:
+            self.listing.append((self.ep + self.instruction_counter, len(self.final_text), directive))
+        self.final_text.append(value)
+        self.sizes.append(size)
+        self.instruction_counter += size
 
     def advance(self):
         self.pos += 1
-        self.current_token = self.tokens[self.pos] if self.pos < len(self.tokens) else None
-    
+        self.current_token = self.tokens[self.pos] if self.pos < self.token_count else None
+
+    def get_form(self, mnemonic, kinds):
+        form = INSTRUCTIONS[mnemonic].get(tuple(kinds))
+        if form == None:
+            expected = " or ".join(", ".join(signature) for signature in INSTRUCTIONS[mnemonic])
+            raise Exception("Invalid operands for " + mnemonic + ": got " + ", ".join(kinds) + " but expected " + expected)
+        return form
+
+    def instruction(self, mnemonic):
+        self.advance()
+
+        kinds = []
+        values = []
+        for i in range(ARITY[mnemonic]):
+            if i > 0:
+                if self.current_token == None or self.current_token.type != TokenTypes.COMMA:
+                    raise Exception("Comma expected but not found in " + mnemonic + " instruction")
+                self.advance()
+
+            if self.statements != None:
+                raw = self.get_raw("Imm16")
+                kind, value = (REG, REGISTERS[raw]) if raw in REGISTERS else (IMM, raw)
+            else:
+                kind, value = self.get_operand()
+            kinds.append(kind)
+            values.append(value)
+            self.advance()
+
+        opcode, slots = self.get_form(mnemonic, kinds)
+        if self.statements != None:
+            self.statements.append((INSTRUCTION, mnemonic, tuple(zip(kinds, values))))
+        else:
+            self.emit(encode(opcode, values, slots), 0x04, mnemonic)
+
+    def data(self, directive):
+        # db and dw take a comma separated list of values
+        get, size = (self.get_imm8, 0x01) if directive == "db" else (self.get_imm16, 0x02)
+        if self.statements != None:
+            # the optimizer gets the values unresolved
+            values = []
+            self.statements.append((DATA, directive, values))
+            expected = "Imm8" if directive == "db" else "Imm16"
+            get = lambda: self.get_raw(expected)
+
+        self.advance()
+        self.data_item(get(), size, directive)
+        self.advance()
+
+        while self.current_token != None and self.current_token.type == TokenTypes.COMMA:
+            self.advance()
+            self.data_item(get(), size, directive)
+            self.advance()
+
+    def data_item(self, value, size, directive):
+        if self.statements != None:
+            self.statements[-1][2].append(value)
+        else:
+            self.emit(value, size, directive)
+
+    def define(self, name):
+        self.labels[name] = self.ep + self.instruction_counter
+
+    def label(self, name):
+        # 0x00 + (2 * instruction_index) = memory offset to jump to labels
+        self.advance()
+
+        if self.current_token != None and self.current_token.type == TokenTypes.COLLON:
+            if self.statements != None:
+                self.statements.append((LABEL, name))
+            else:
+                self.define(name)
+            self.advance()
+        else:
+            raise Exception("Expected \":\" but got \"" + (self.current_token.value if self.current_token != None else "end of file") + "\"")
+
+    def statement(self):
+        if self.current_token.type != TokenTypes.ID:
+            raise Exception("An assembly statement can never start with a number")
+
+        value = self.current_token.value
+        if value in INSTRUCTIONS:
+            self.instruction(value)
+        elif value == "db" or value == "dw":
+            self.data(value)
+        elif value in REGISTERS:
+            raise Exception("Unexpected register reference")
+        else:
+            self.label(value)
+
+    def encode_statements(self, statements):
+        for statement in statements:
+            if statement[0] == LABEL:
+                self.define(statement[1])
+            elif statement[0] == INSTRUCTION:
+                mnemonic, operands = statement[1], statement[2]
+                kinds = [kind for kind, _ in operands]
+                values = [value if kind == REG else self.value(value, 16) for kind, value in operands]
+                opcode, slots = self.get_form(mnemonic, kinds)
+                self.emit(encode(opcode, values, slots), 0x04, mnemonic)
+            else:
+                bits, item_size = (8, 0x01) if statement[1] == "db" else (16, 0x02)
+                for value in statement[2]:
+                    self.emit(self.value(value, bits), item_size, statement[1])
+
     def Gen(self):
-        # loop through all tokens
+        self.Encode()
+        self.resolve_fixups()
+        return self.final_text
+
+    def Encode(self):
+        # loop through all tokens, labels used before their definition are left to resolve_fixups()
+        while self.current_token != None:
+            self.statement()
+
+        if self.statements != None:
+            optimized = optimize(self.statements)
+            self.optimized = (size(self.statements), size(optimized))
+            self.encode_statements(optimized)
+
+    def Parse(self):
+        # the statements of the source with labels and operands unresolved, nothing is encoded
+        self.statements = []
         while self.current_token != None:
-            if self.current_token.type == TokenTypes.ID:
-                if self.current_token.value in OPCODE_MAP.keys():
-                    opcode = self.current_token.value
-                    opcode_value = OPCODE_MAP[self.current_token.value]
-                    self.advance()
-                    # check what the args are. If any are expected and either increment in hex or don't depending on the argument. Then make the whole instruction as encoded binary
-                    
-                    if opcode_value == 0x00:                           # nop
-                        self.final_text.append(self.make_instruction(opcode=0))
-                    elif opcode_value == 0x01:                         # mov
-                        # check for 2 registers as argument
-                        regs = []
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS.keys():
-                            regs.append(self.current_token.value)
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.COMMA:
-                                self.advance()
-                                
-                                if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS.keys():
-                                    regs.append(self.current_token.value)
-                                    self.final_text.append(self.make_instruction(opcode_value, regs[0], regs[1]))
-                                    self.advance()
-                                else:
-                                    raise Exception("Expected second register in mov instruction")
-                            else:
-                                raise Exception("Second argument for mov expected")
-                        else:
-                            raise Exception("Expected register in mov instruction")
-                    elif opcode_value == 0x02:                         # lod
-                        # check for reg and imm16
-                        register = ""
-                        imm16 = ""
-                        
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS.keys():
-                            register = self.current_token.value
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.COMMA:
-                                self.advance()
-                                
-                                imm16 = self.get_imm16()
-                                    
-                                self.advance()
-                                self.final_text.append(self.make_instruction(opcode=opcode_value, register1=register, imm16=imm16))
-                            else:
-                                raise Exception("expected second argument")
-                        else:
-                            raise Exception("Expected arguments for lod")
-                    elif opcode_value == 0x03: # out
-                        imm16 = self.get_imm16()
-                        register = ""
-                        self.advance()
-                        
-                        if self.current_token.type == TokenTypes.COMMA:
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS.keys():
-                                register = self.current_token.value
-                                
-                                self.final_text.append(self.make_instruction(opcode=opcode_value, imm16=imm16, register2=register))
-                                self.advance()
-                            else:
-                                raise Exception("Expected register as second argument for out")
-                        else:
-                            raise Exception("Expected second argument in out")
-                    elif opcode_value == 0x04: # inp
-                        imm16 = self.get_imm16()
-                        register = ""
-                        self.advance()
-                        
-                        if self.current_token.type == TokenTypes.COMMA:
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS.keys():
-                                register = self.current_token.value
-                                
-                                self.final_text.append(self.make_instruction(opcode=opcode_value, imm16=imm16, register1=register))
-                                self.advance()
-                            else:
-                                raise Exception("Expected register as second argument for out")
-                        else:
-                            raise Exception("Expected second argument in out")
-                    elif opcode_value == 0x05 or opcode_value == 0x11 or opcode_value == 0x18 or opcode_value == 0x1a or opcode_value == 0x1c:                         # jnz
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS:
-                            # is a register. Add 0x01
-                            opcode_value += 0x01
-                            
-                            self.final_text.append(self.make_instruction(opcode_value, register2=self.current_token.value))
-                            self.advance()
-                        else:
-                            imm16 = self.get_imm16()
-                            
-                            self.final_text.append(self.make_instruction(opcode_value, imm16=imm16))
-                            self.advance()
-                    elif opcode_value == 0x07 or opcode_value == 0x09 or opcode_value == 0x0b or opcode_value == 0x0d or opcode_value == 0x0f:                         # add
-                        register1 = "r0"
-                        register2 = "r0"
-                        imm16     = 0
-                        
-                        if self.current_token.value in REGISTERS:
-                            register1 = self.current_token.value
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.COMMA:
-                                self.advance()
-                            else:
-                                raise Exception("Comma expected but not found")
-                        else:
-                            raise Exception("Register expected but not found")
-                        
-                        if self.current_token.value in REGISTERS:
-                            register2 = self.current_token.value
-                            self.advance()
-                        else:
-                            imm16 = self.get_imm16()
-                            opcode_value += 0x01
-                            self.advance()
-                        
-                        self.final_text.append(self.make_instruction(opcode_value, register1, register2, imm16))
-                    elif opcode_value == 0x17: # swp
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS:
-                            self.final_text.append(self.make_instruction(opcode_value, self.current_token.value))
-                            self.advance()
-                        else:
-                            raise Exception("Register expected but not found")
-                    elif opcode_value == 0x13 or opcode_value == 0x15:
-                        register1 = "r0"
-                        register2 = "r0"
-                        imm16     = 0
-                        
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS:
-                            register1 = self.current_token.value
-                            self.advance()
-                            
-                            if self.current_token.type == TokenTypes.COMMA:
-                                self.advance()
-                            else:
-                                raise Exception("Comma expected but not found")
-                        else:
-                            raise Exception("Register expected but not found")
-                        
-                        if self.current_token.type == TokenTypes.ID and self.current_token.value in REGISTERS:
-                            register2 = self.current_token.value
-                            opcode_value += 1
-                            self.advance()
-                        else:
-                            imm16 = self.get_imm16()
-                            self.advance()
-                        self.final_text.append(self.make_instruction(opcode_value, register1, register2, imm16))
-                    
-                    self.instruction_counter += 0x04
-                elif self.current_token.value == "db": # db
-                    self.advance()
-                    imm8 = self.get_imm8()
-                    self.final_text.append("0x{:02x}".format(imm8))
-                    self.advance()
-                    self.instruction_counter += 0x1
-                    
-                    
-                    while self.current_token.type == TokenTypes.COMMA and self.current_token != None:
-                        self.advance()
-                        imm8 = self.get_imm8()
-                        self.final_text.append("0x{:02x}".format(imm8))
-                        self.instruction_counter += 0x1
-                        self.advance()
-                elif self.current_token.value == "dw": #dw
-                    self.advance()
-                    imm16 = self.get_imm16()
-                    self.final_text.append("0x{:04x}".format(imm16))
-                    self.advance()
-                    self.instruction_counter += 0x02
-                    
-                    while self.current_token.type == TokenTypes.COMMA and self.current_token != None:
-                        self.advance()
-                        imm16 = self.get_imm16()
-                        self.final_text.append("0x{:04x}".format(imm16))
-                        self.instruction_counter += 0x02
-                        self.advance()
-                elif self.current_token.value in REGISTERS.keys():
-                    raise Exception("Unexpected register reference")
-                else:
-                    # check for label
-                    # 0x00 + (2 * instruction_index) = memory offset to jump to labels
-                    potential_label_name = self.current_token.value
-                    self.advance()
-                    
-                    if self.current_token.type == TokenTypes.COLLON:
-                        LABELS.update({potential_label_name: hex(self.ep + int(self.instruction_counter))})
-                        self.advance()
-                    else:
-                        raise Exception("Expected \":\" but got \"" + self.current_token.value + "\"")
+            self.statement()
+        return self.statements
+
+    def Listing(self):
+        lines = []
+        for address, index, directive in self.listing:
+            value = self.final_text[index]
+            if directive == "db":
+                lines.append("0x{:04x}: db 0x{:02x}".format(address, value))
+            elif directive == "dw":
+                lines.append("0x{:04x}: dw 0x{:04x}".format(address, value))
             else:
-                raise Exception("An assembly statement can never start with a number")
-        
-        new_final_text = []
-        for i in self.final_text:
-            new_final_text.append(int(i, base=16))
-        
-        return new_final_text
+                lines.append("0x{:04x}: 0x{:02x} {:01x} {:01x} {:04x} ; {}".format(address, value >> 24, value >> 20 & 0xF, value >> 16 & 0xF, value & 0xFFFF, directive))
+        return lines
@@ -0,0 +1,150 @@
+# assembled memory image and the output formats it can be written in
+
+import os
+import struct
+
+# memory map, see cpu_spec.txt
+ROM_START = 0x0000
+RAM_START = 0x8000
+BANK_START = 0xc000
+MEMORY_END = 0x10000
+BANK_SIZE = 0x4000
+BANK_COUNT = 256
+
+# item size -> packer, instructions are 4 bytes, dw 2 bytes and db 1 byte. Values are written big endian
+PACKERS = {4: struct.Struct(">I").pack_into, 2: struct.Struct(">H").pack_into, 1: struct.Struct(">B").pack_into}
+
+FORMATS = ("bin", "banks", "ihex", "c")
+
+C_BYTES = ["0x{:02x}, ".format(byte) for byte in range(256)]
+
+
+def pack(values, sizes, length):
+    data = bytearray(length)
+    packers = PACKERS
+    offset = 0
+    for value, size in zip(values, sizes):
+        packers[size](data, offset, value)
+        offset += size
+    return data
+
+
+class Image:
+    def __init__(self, origin, data, bank=0, symbols=None) -> None:
+        if origin + len(data) > MEMORY_END:
+            raise Exception("Image from " + hex(origin) + " with " + str(len(data)) + " bytes does not fit into the 64KB address space")
+        if not 0 <= bank < BANK_COUNT:
+            raise Exception("Bank " + str(bank) + " does not exist, there are " + str(BANK_COUNT) + " banks")
+
+        self.origin = origin
+        self.data = data
+        # bank selected while the code in 0xc000 - 0xffff runs
+        self.bank = bank
+        # label name -> address
+        self.symbols = symbols if symbols is not None else {}
+
+    @classmethod
+    def from_generator(cls, generator, bank=0):
+        return cls(generator.ep, pack(generator.final_text, generator.sizes, generator.instruction_counter), bank, dict(generator.labels))
+
+    def regions(self):
+        # (name, start address, bytes) for every part of the memory map the image covers
+        regions = []
+        view = memoryview(self.data)
+        end = self.origin + len(self.data)
+        for name, start, stop in (("rom", ROM_START, RAM_START), ("ram", RAM_START, BANK_START), ("bank", BANK_START, MEMORY_END)):
+            lo = max(start, self.origin)
+            hi = min(stop, end)
+            if lo < hi:
+                regions.append((name, lo, view[lo - self.origin:hi - self.origin]))
+        return regions
+
+    def rom(self):
+        # contents of the rom chip, starting at address 0
+        rom = bytearray(0)
+        for name, start, data in self.regions():
+            if name == "ram":
+                raise Exception("Image places data in ram (" + hex(RAM_START) + " - " + hex(BANK_START - 1) + "), which can not be flashed")
+            elif name == "rom":
+                rom = bytearray(start - ROM_START + len(data))
+                rom[start - ROM_START:] = data
+        return rom
+
+    def banks(self):
+        # bank number -> full BANK_SIZE contents of that bank
+        banks = {}
+        for name, start, data in self.regions():
+            if name == "bank":
+                bank = bytearray(BANK_SIZE)
+                bank[start - BANK_START:start - BANK_START + len(data)] = data
+                banks[self.bank] = bank
+        return banks
+
+    def ihex(self):
+        # intel hex with cpu addresses. Banked data is placed at (bank << 16) | address
+        # through an extended linear address record
+        lines = []
+        for name, start, data in self.regions():
+            upper = self.bank if name == "bank" else 0
+            lines.append(ihex_record(0x04, 0, upper.to_bytes(2, "big")))
+            for offset in range(0, len(data), 16):
+                lines.append(ihex_record(0x00, start + offset, data[offset:offset + 16]))
+        lines.append(ihex_record(0x01, 0, b""))
+        return "\n".join(lines) + "\n"
+
+    def c_header(self):
+        return c_header(self.data)
+
+    def write(self, path, format="bin"):
+        if format == "bin":
+            write_file(path, self.data)
+        elif format == "banks":
+            # <output> holds the rom, <output stem>.bankNN<ext> every bank
+            stem, ext = os.path.splitext(path)
+            rom = self.rom()
+            if rom:
+                write_file(path, rom)
+            for bank, data in self.banks().items():
+                write_file("{}.bank{:02x}{}".format(stem, bank, ext), data)
+        elif format == "ihex":
+            write_file(path, self.ihex().encode())
+        elif format == "c":
+            write_file(path, self.c_header().encode())
+        else:
+            raise Exception("Unknown output format: " + format)
+
+
+def symbol_lines(symbols):
+    # "address name" for every label, sorted by address. read_symbols() reads this back
+    return ["0x{:04x} {}".format(address, name) for name, address in sorted(symbols.items(), key=lambda label: (label[1], label[0]))]
+
+
+def read_symbols(path):
+    # (address, name) of every line of a symbol map, sorted by address
+    symbols = []
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                address, name = line.split()
+                symbols.append((int(address, base=16), name))
+    return sorted(symbols)
+
+
+def ihex_record(type, address, data):
+    record = bytes((len(data), address >> 8 & 0xFF, address & 0xFF, type)) + bytes(data)
+    return ":" + (record + bytes(((-sum(record)) & 0xFF,))).hex().upper()
+
+
+def c_header(data):
+    lines = ["const unsigned char eeprom_content[] = {"]
+    for i in range(0, len(data), 16):
+        lines.append("    " + "".join(map(C_BYTES.__getitem__, data[i:i + 16])))
+    lines.append("};")
+    lines.append("const unsigned int eeprom_content_len = {};".format(len(data)))
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
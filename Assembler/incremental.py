@@ -0,0 +1,253 @@
+# line level incremental assembly for editors and --watch. Every line keeps its own encoding with
+# all label references left open, so an edit only lexes and encodes the changed lines, moves the
+# bytes behind them and patches the references to labels whose address changed. Sources where
+# that could differ from a full build (a statement spread over several lines or a label defined
+# twice) are assembled in full instead
+
+from lexer import StreamLexer
+from gen import Generator
+from assembler import assemble
+from image import Image, PACKERS, MEMORY_END, pack
+from optimize import LABEL
+
+
+class NotIncremental(Exception):
+    pass
+
+
+class Line:
+    __slots__ = ("text", "start", "size", "data", "labels", "refs")
+
+    def __init__(self, text) -> None:
+        self.text = text
+        # offset of the line in the image
+        self.start = 0
+
+        try:
+            generator = Generator(StreamLexer(text).Lex(), 0)
+            statements = generator.Parse()
+        except Exception as e:
+            # most likely a statement continued on the next line. Lexer errors are left to the full
+            # build as well, it knows the real line number
+            raise NotIncremental(str(e))
+
+        # (name, offset in the line) of every label, references are all encoded as fixups
+        self.labels = []
+        for statement in statements:
+            if statement[0] == LABEL:
+                self.labels.append((statement[1], generator.instruction_counter))
+            else:
+                generator.encode_statements((statement,))
+
+        offsets = [0] * len(generator.sizes)
+        offset = 0
+        for i, size in enumerate(generator.sizes):
+            offsets[i] = offset
+            offset += size
+        # (offset in the line, item size, value without the label, label name, bits)
+        self.refs = [(offsets[index], generator.sizes[index], generator.final_text[index], name, bits) for index, name, bits in generator.fixups]
+        self.size = generator.instruction_counter
+        self.data = pack(generator.final_text, generator.sizes, self.size)
+
+
+def common_length(equal, limit):
+    # the length of the common start (or end) of two strings, compared in blocks that grow while
+    # they match and shrink once they don't so the loop runs in c and only a few times
+    length, block = 0, 256
+    while block and length < limit:
+        size = min(block, limit - length)
+        if equal(length, size):
+            length += size
+            block *= 2
+        else:
+            block = size // 2
+    return length
+
+
+class IncrementalAssembler:
+    def __init__(self, source="", origin=0, bank=0) -> None:
+        self.origin = origin
+        self.bank = bank
+        # per line state, None while the source can only be assembled in full
+        self.lines = None
+        self.texts = []
+        # the source of the last update, None after an edit
+        self.source = None
+        self.data = bytearray()
+        self.symbols = {}
+        # label name -> (line, offset) and label name -> lines referencing it
+        self.labels = {}
+        self.references = {}
+        self.resolver = Generator([], origin)
+        # the reason the last build was not incremental (None if it was) and how many were not
+        self.fallback = None
+        self.full_builds = 0
+        self.update(source)
+
+    def update(self, source):
+        # brings the image in line with source, returns the number of lines that were encoded again
+        if self.lines is not None:
+            try:
+                return self.apply(source)
+            except Exception:
+                # not incremental anymore or an error, which the full build reports like a normal assembly
+                pass
+        self.source = source
+        return self.build(source.split("\n"))
+
+    def edit(self, first, end, texts):
+        # replaces the lines first to end (exclusive) by texts, for editors that know what changed
+        self.source = None
+        source = self.texts[:first] + texts + self.texts[end:]
+        if self.lines is not None:
+            try:
+                return self.replace(first, end, texts)
+            except Exception:
+                pass
+        return self.build(source)
+
+    def build(self, texts):
+        self.lines = None
+        self.texts = texts
+        self.fallback = None
+        try:
+            return self.build_lines(texts)
+        except Exception as e:
+            # why every update assembles in full until the source can be split into lines again
+            self.fallback = str(e)
+            self.full_builds += 1
+
+        # not incremental or broken. assemble() resolves labels defined twice in source order and
+        # raises the same error a normal assembly would
+        image = assemble("\n".join(texts), self.origin, self.bank)
+        self.data = image.data
+        self.symbols = image.symbols
+        return len(texts)
+
+    def build_lines(self, texts):
+        lines = [Line(text) for text in texts]
+        if self.has_duplicates(lines):
+            raise NotIncremental("Label defined twice")
+
+        self.labels = {}
+        self.references = {}
+        offset = 0
+        for line in lines:
+            line.start = offset
+            offset += line.size
+            self.add(line)
+        self.data = bytearray(b"".join(line.data for line in lines))
+        for line in lines:
+            self.patch(line)
+        self.check_size()
+        self.symbols = {name: self.address(name) for name in self.labels}
+        self.lines = lines
+        return len(texts)
+
+    def has_duplicates(self, lines):
+        names = [name for line in lines for name, _ in line.labels]
+        return len(set(names)) != len(names)
+
+    def check_size(self):
+        if self.origin + len(self.data) > MEMORY_END:
+            raise Exception("Image from " + hex(self.origin) + " with " + str(len(self.data)) + " bytes does not fit into the 64KB address space")
+
+    def add(self, line):
+        for name, offset in line.labels:
+            if name in self.labels:
+                raise NotIncremental("Label " + name + " defined twice")
+            self.labels[name] = (line, offset)
+        for ref in line.refs:
+            self.references.setdefault(ref[3], set()).add(line)
+
+    def remove(self, line):
+        for name, _ in line.labels:
+            del self.labels[name]
+        for ref in line.refs:
+            lines = self.references.get(ref[3])
+            if lines is not None:
+                lines.discard(line)
+
+    def address(self, name):
+        line, offset = self.labels[name]
+        return self.origin + line.start + offset
+
+    def patch(self, line, names=None):
+        # writes the label values into the references of line, only those to names if given
+        for offset, size, value, name, bits in line.refs:
+            if names is not None and name not in names:
+                continue
+            if name not in self.labels:
+                raise Exception("Invalid label: " + name)
+            PACKERS[size](self.data, line.start + offset, value | self.resolver.label_value(name, self.address(name), bits))
+
+    def apply(self, source):
+        old = self.source if self.source is not None else "\n".join(self.texts)
+        if old == source:
+            self.source = source
+            return 0
+        # the source only differs between the characters start and the ends, found without splitting it
+        limit = min(len(old), len(source))
+        start = common_length(lambda i, size: old[i:i + size] == source[i:i + size], limit)
+        common = common_length(lambda i, size: old[len(old) - i - size:len(old) - i] == source[len(source) - i - size:len(source) - i], limit - start)
+        old_end = len(old) - common
+        new_end = len(source) - common
+
+        # the whole lines around them
+        first = old.count("\n", 0, start)
+        last = old.count("\n", 0, old_end) + 1
+        line_start = old.rfind("\n", 0, start) + 1
+        line_end = source.find("\n", new_end)
+        texts = source[line_start:line_end if line_end >= 0 else len(source)].split("\n")
+
+        self.source = None
+        changed = self.replace(first, last, texts)
+        self.source = source
+        return changed
+
+    def replace(self, first, old_end, texts):
+        added = [Line(text) for text in texts]
+        removed = self.lines[first:old_end]
+        start = removed[0].start if removed else (self.lines[first].start if first < len(self.lines) else len(self.data))
+        delta = sum(line.size for line in added) - sum(line.size for line in removed)
+
+        # labels whose address changes: the ones of the edited lines and all behind them if the size changed
+        moved = set()
+        for line in removed:
+            self.remove(line)
+            moved.update(name for name, _ in line.labels)
+        for line in added:
+            self.add(line)
+            moved.update(name for name, _ in line.labels)
+
+        self.data[start:start + sum(line.size for line in removed)] = b"".join(line.data for line in added)
+        offset = start
+        for line in added:
+            line.start = offset
+            offset += line.size
+        self.lines[first:old_end] = added
+        self.texts[first:old_end] = texts
+
+        if delta:
+            for line in self.lines[first + len(added):]:
+                line.start += delta
+                for name, _ in line.labels:
+                    moved.add(name)
+
+        for line in added:
+            self.patch(line)
+        patched = set(added)
+        for name in moved:
+            for line in self.references.get(name, ()):
+                if line not in patched:
+                    self.patch(line, moved)
+                    patched.add(line)
+            if name in self.labels:
+                self.symbols[name] = self.address(name)
+            else:
+                self.symbols.pop(name, None)
+        self.check_size()
+        return len(added)
+
+    def image(self):
+        return Image(self.origin, bytearray(self.data), self.bank, dict(self.symbols))
@@ -0,0 +1,54 @@
+# instruction set of the cpu, see cpu_spec.txt
+
+# operand kinds
+REG = "reg"
+IMM = "imm16"
+
+# bit position of each operand slot in the 32 bit instruction word
+# 00000000 0000 0000 0000000000000000
+# opcode   reg2 reg1 imm16 (stored byte swapped)
+OPCODE_SHIFT = 24
+REG2 = 20
+REG1 = 16
+IMM16 = 0
+
+REGISTERS = {"r0": 0x00, "r1": 0x01, "r2": 0x02, "sp": 0x0c}
+
+# mnemonic -> operand signature -> (opcode, slot of every operand)
+INSTRUCTIONS = {
+    "nop": {(): (0x00, ())},
+    "mov": {(REG, REG): (0x01, (REG1, REG2))},
+    "lod": {(REG, IMM): (0x02, (REG1, IMM16))},
+    "out": {(IMM, REG): (0x03, (IMM16, REG2))},
+    "inp": {(IMM, REG): (0x04, (IMM16, REG1))},
+    "jnz": {(IMM,): (0x05, (IMM16,)), (REG,): (0x06, (REG2,))},
+    "add": {(REG, REG): (0x07, (REG1, REG2)), (REG, IMM): (0x08, (REG1, IMM16))},
+    "sub": {(REG, REG): (0x09, (REG1, REG2)), (REG, IMM): (0x0a, (REG1, IMM16))},
+    "nad": {(REG, REG): (0x0b, (REG1, REG2)), (REG, IMM): (0x0c, (REG1, IMM16))},
+    "nor": {(REG, REG): (0x0d, (REG1, REG2)), (REG, IMM): (0x0e, (REG1, IMM16))},
+    "cmp": {(REG, REG): (0x0f, (REG1, REG2)), (REG, IMM): (0x10, (REG1, IMM16))},
+    "jzr": {(IMM,): (0x11, (IMM16,)), (REG,): (0x12, (REG2,))},
+    "ldr": {(REG, IMM): (0x13, (REG1, IMM16)), (REG, REG): (0x14, (REG1, REG2))},
+    "wtr": {(REG, IMM): (0x15, (REG1, IMM16)), (REG, REG): (0x16, (REG1, REG2))},
+    "swp": {(REG,): (0x17, (REG1,))},
+    "jmp": {(IMM,): (0x18, (IMM16,)), (REG,): (0x19, (REG2,))},
+    "jeq": {(IMM,): (0x1a, (IMM16,)), (REG,): (0x1b, (REG2,))},
+    "jnq": {(IMM,): (0x1c, (IMM16,)), (REG,): (0x1d, (REG2,))},
+}
+
+# operand count of every mnemonic, all signatures of a mnemonic have the same length
+ARITY = {mnemonic: len(next(iter(forms))) for mnemonic, forms in INSTRUCTIONS.items()}
+
+# lowest opcode of every mnemonic
+OPCODE_MAP = {mnemonic: min(opcode for opcode, _ in forms.values()) for mnemonic, forms in INSTRUCTIONS.items()}
+
+
+def swap16(value):
+    return (value & 0xFF) << 8 | (value & 0xFF00) >> 8
+
+
+def encode(opcode, values=(), slots=()):
+    word = opcode << OPCODE_SHIFT
+    for value, slot in zip(values, slots):
+        word |= value << slot
+    return word
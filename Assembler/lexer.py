@@ -1,5 +1,8 @@
-from dataclasses import dataclass
+from array import array
+from bisect import bisect_right
 import enum
+import re
+import sys
 
 
 class TokenTypes(enum.Enum):
@@ -17,11 +20,37 @@ NUMBERS = "0123456789"
 ADDITIONAL_HEX_VALUES = "abcdef"
 
 
-@dataclass
+# every match is (leading blanks, token), only the span of the token is used. Mirrors the rules of Lexer below, the kind of
+# a token is looked up from its first character in TOKEN_TABLE. A token is never a blank, so blanks at the end of the text
+# match nothing and are skipped
+TOKEN_REGEX = re.compile(r"""
+    ([ \t]*)
+    (
+        0x[0-9a-f]*
+      | 0b[01]*
+      | [0-9]+
+      | [a-z][a-z0-9]*
+      | ;[^\n]*
+      | [^ \t]
+    )
+""", re.VERBOSE | re.IGNORECASE | re.DOTALL)
+
+TOKEN_TABLE = {":": TokenTypes.COLLON, ",": TokenTypes.COMMA}
+for ch in ALPHABET + ALPHABET.upper():
+    TOKEN_TABLE[ch] = TokenTypes.ID
+for ch in NUMBERS:
+    TOKEN_TABLE[ch] = TokenTypes.DECIMAL_IMM16
+NUMBER_PREFIXES = {"0x": TokenTypes.HEXADECIMAL_IMM16, "0b": TokenTypes.BINARY_IMM16}
+
+
 class Token:
-    def __init__(self, value: str, type: int) -> None:
+    __slots__ = ("value", "type", "line", "column")
+
+    def __init__(self, value: str, type: int, line: int = None, column: int = None) -> None:
         self.value = value
         self.type = type
+        self.line = line
+        self.column = column
     
     def __repr__(self) -> str:
         return "Val: " + str(self.value) + "; Type: " + str(self.type)
@@ -108,3 +137,111 @@ class Lexer:
                 raise Exception("Unexpected token: \"" + self.current_char + "\"")
             
         return tokens
+
+
+class RegexLexer:
+    def __init__(self, text) -> None:
+        self.text = text
+
+    def Lex(self):
+        return list(scan(self.text))
+
+
+TOKEN_TYPES = sorted(TokenTypes, key=lambda type: type.value)
+
+
+class TokenStream:
+    # tokens stored as parallel type/offset/length columns over the source text.
+    # Token objects are only created on access and mnemonics/labels are interned,
+    # so a stream costs 9 bytes per token instead of a full object per token
+    def __init__(self, text, first_line=1) -> None:
+        self.text = text
+        self.types = array("B")
+        self.offsets = array("I")
+        self.lengths = array("I")
+        self.line_starts = array("I", [0])
+        self.first_line = first_line
+        self.ids = {}
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index) -> Token:
+        if index < 0:
+            index += len(self.types)
+        offset = self.offsets[index]
+        line = bisect_right(self.line_starts, offset)
+        return Token(self.value(index), TOKEN_TYPES[self.types[index]], self.first_line + line - 1, offset - self.line_starts[line - 1] + 1)
+
+    def __iter__(self):
+        # going through the tokens in order, the line is followed along instead of searched for
+        # every token and value() is inlined
+        text = self.text
+        ids = self.ids
+        id_type = TokenTypes.ID.value
+        starts = iter(self.line_starts[1:])
+        line = self.first_line
+        line_start = 0
+        next_start = next(starts, len(text) + 1)
+        for type, offset, length in zip(self.types, self.offsets, self.lengths):
+            while offset >= next_start:
+                line += 1
+                line_start = next_start
+                next_start = next(starts, len(text) + 1)
+            value = text[offset:offset + length].lower()
+            if type == id_type:
+                interned = ids.get(value)
+                if interned is None:
+                    interned = ids[value] = sys.intern(value)
+                value = interned
+            yield Token(value, TOKEN_TYPES[type], line, offset - line_start + 1)
+
+    def value(self, index) -> str:
+        offset = self.offsets[index]
+        value = self.text[offset:offset + self.lengths[index]].lower()
+        if self.types[index] != TokenTypes.ID.value:
+            # numbers are parsed once, punctuation is a cached single character string
+            return value
+        interned = self.ids.get(value)
+        if interned is None:
+            interned = self.ids[value] = sys.intern(value)
+        return interned
+
+
+def scan(text, first_line=1):
+    # the TokenStream of text, the one scan RegexLexer, StreamLexer and stream.py share.
+    # first_line is the number of the first line of text, for chunks of a longer source
+    stream = TokenStream(text, first_line)
+    append_type = stream.types.append
+    append_offset = stream.offsets.append
+    append_length = stream.lengths.append
+    table = TOKEN_TABLE
+    prefixes = NUMBER_PREFIXES
+    decimal = TokenTypes.DECIMAL_IMM16
+
+    for match in TOKEN_REGEX.finditer(text):
+        start, end = match.span(2)
+        first = text[start]
+        type = table.get(first)
+        if type is None:
+            if first == "\n":
+                stream.line_starts.append(end)
+            elif first != ";":
+                line = len(stream.line_starts)
+                raise Exception("Unexpected token: \"" + text[start:end] + "\" at line " + str(first_line + line - 1) + ", column " + str(start - stream.line_starts[line - 1] + 1))
+        else:
+            if type is decimal:
+                type = prefixes.get(text[start:start + 2].lower(), decimal)
+            append_type(type.value)
+            append_offset(start)
+            append_length(end - start)
+
+    return stream
+
+
+class StreamLexer(RegexLexer):
+    def Lex(self):
+        return scan(self.text)
+
+
+LEXERS = {"stream": StreamLexer, "regex": RegexLexer, "legacy": Lexer}
@@ -1,25 +1,152 @@
-import struct
+import argparse
+import os
 import sys
-from tokenize import Token
-import lexer
-from lexer import Lexer
+import time
+from lexer import LEXERS, TokenStream
 from gen import Generator
+from image import Image, FORMATS, symbol_lines
+from cache import Cache, DEFAULT_SIZE
+from incremental import IncrementalAssembler
+from stream import assemble_stream
+from stats import Stats
 
-import argparse
+
+def write_symbols(path, symbols):
+    with open(path, "w") as f:
+        f.write("\n".join(symbol_lines(symbols)) + "\n")
+
+
+def write(image, args):
+    if args.symbols:
+        write_symbols(args.symbols, image.symbols)
+    image.write(args.output, args.format)
+
+
+def watch(args, ep):
+    # assembles the input again whenever it changes, only the edited lines are encoded again
+    assembler = None
+    modified = None
+    while True:
+        try:
+            stat = os.stat(args.input)
+        except OSError:
+            stat = None
+        if stat is not None and (stat.st_mtime_ns, stat.st_size) != modified:
+            modified = (stat.st_mtime_ns, stat.st_size)
+            with open(args.input, "r") as f:
+                source = f.read()
+
+            start = time.perf_counter()
+            try:
+                if assembler is None:
+                    assembler = IncrementalAssembler(source, ep, args.bank)
+                    lines = len(assembler.texts)
+                else:
+                    lines = assembler.update(source)
+                image = assembler.image()
+            except Exception as e:
+                # the last good image stays in place, the next one that assembles replaces it
+                print("{}: {}".format(args.input, e), file=sys.stderr)
+            else:
+                elapsed = time.perf_counter() - start
+                write(image, args)
+                print("{}: {} lines encoded in {:.3f}ms, {} bytes".format(args.input, lines, elapsed * 1000, len(image.data)))
+                if assembler.fallback is not None:
+                    print("{}: assembled in full, not incremental: {}".format(args.input, assembler.fallback))
+            sys.stdout.flush()
+        time.sleep(args.interval)
 
 if __name__=="__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--offset", type=str, default="0x0")
     parser.add_argument("--output", type=str, default="a.bin")
     parser.add_argument("--input", type=str, default="tests/test.16bs")
+    parser.add_argument("--lexer", type=str, choices=LEXERS.keys(), default="stream")
+    parser.add_argument("--listing", action="store_true", help="print the address and encoding of every emitted item")
+    parser.add_argument("--format", type=str, choices=FORMATS, default="bin", help="raw binary, rom + per bank images, intel hex or a c header")
+    parser.add_argument("--bank", type=int, default=0, help="bank the code in 0xc000 - 0xffff belongs to")
+    parser.add_argument("--symbols", type=str, help="write the address of every label to this file")
+    parser.add_argument("--optimize", action="store_true", help="remove redundant instructions and thread jumps before encoding")
+    parser.add_argument("--cache-dir", type=str, help="reuse images assembled before from the same source and options")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_SIZE >> 20, help="size limit of the cache in MB")
+    parser.add_argument("--watch", action="store_true", help="keep running and assemble the input again whenever it changes")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between checks of the input in --watch mode")
+    parser.add_argument("--stream", action="store_true", help="read, encode and write in chunks so memory stays flat for huge sources, raw binary only")
+    parser.add_argument("--stats", type=str, help="write the time and net memory blocks of every phase and the token, instruction, label and byte counts as json to this file, - prints them")
+    parser.add_argument("--profile", type=str, help="run cProfile over the assembly and dump it to this file, the hot functions also go into --stats. Slows the assembly down")
 
     args = parser.parse_args()
 
     ep = int(args.offset, base=16)
-    with open(args.input, "r") as f:
-        tokens = Lexer(f.read()).Lex()
-        text = Generator(tokens, ep).Gen()
-        
-        with open(args.output, "wb") as f:
-            for i in text:
-                f.write(struct.pack(">I", i))
+    if args.watch:
+        if args.optimize or args.listing:
+            parser.error("--watch can not be combined with --optimize or --listing")
+        try:
+            watch(args, ep)
+        except KeyboardInterrupt:
+            pass
+        sys.exit(0)
+
+    stats = Stats(profile=args.profile is not None)
+
+    if args.stream:
+        if args.optimize or args.listing or args.cache_dir or args.format != "bin":
+            parser.error("--stream only writes --format bin and can not be combined with --optimize, --listing or --cache-dir")
+        # reading, encoding and writing are interleaved, they are one phase
+        with stats.phase("stream"):
+            generator = assemble_stream(args.input, args.output, ep)
+        if args.symbols:
+            write_symbols(args.symbols, generator.labels)
+        stats.count(tokens=generator.tokens_read, instructions=generator.instructions, data_items=generator.data_items,
+                    forward_references=generator.forward_references, labels=len(generator.labels), bytes=os.path.getsize(args.output))
+    else:
+        with stats.phase("read"):
+            with open(args.input, "r") as f:
+                source = f.read()
+
+        cache = Cache(args.cache_dir, args.cache_size << 20) if args.cache_dir else None
+        # a listing needs the generator, so it always assembles
+        image = None
+        if cache and not args.listing:
+            with stats.phase("cache"):
+                image = cache.get(source, ep, args.bank, args.optimize)
+
+        if image is None:
+            with stats.phase("lex"):
+                tokens = LEXERS[args.lexer](source).Lex()
+            if isinstance(tokens, TokenStream):
+                stats.note("lex", "token objects are made while encoding, their cost is part of encode")
+            generator = Generator(tokens, ep, listing=args.listing, optimize=args.optimize)
+            with stats.phase("encode"):
+                generator.Encode()
+            forward_references = len(generator.fixups)
+            with stats.phase("resolve"):
+                generator.resolve_fixups()
+            stats.count(tokens=len(tokens), instructions=generator.sizes.count(4), data_items=len(generator.sizes) - generator.sizes.count(4),
+                        forward_references=forward_references)
+
+            if args.optimize:
+                (instructions, size), (optimized_instructions, optimized_size) = generator.optimized
+                print("{}: {} instructions ({} saved), {} bytes ({} saved)".format(
+                    args.input, optimized_instructions, instructions - optimized_instructions, optimized_size, size - optimized_size))
+
+            if args.listing:
+                print("\n".join(generator.Listing()))
+
+            with stats.phase("write"):
+                image = Image.from_generator(generator, args.bank)
+                if cache:
+                    cache.put(source, ep, args.bank, args.optimize, image)
+                write(image, args)
+        else:
+            with stats.phase("write"):
+                write(image, args)
+        stats.count(lines=source.count("\n") + 1, labels=len(image.symbols), bytes=len(image.data), cached=cache is not None and cache.hits > 0)
+
+        if cache:
+            print(cache.stats(), file=sys.stderr)
+
+    if args.profile:
+        stats.dump_profile(args.profile)
+    if args.stats:
+        stats.write(args.stats)
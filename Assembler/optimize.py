@@ -0,0 +1,149 @@
+# peephole and jump threading pass over the parsed statements, run by Generator before it
+# encodes them when optimizing. Labels are not touched and addresses are only assigned after
+# this pass, so every label moves along with the code it belongs to
+
+from isa import IMM
+
+# statements are (LABEL, name), (INSTRUCTION, mnemonic, ((kind, value), ...)) and (DATA, directive, values).
+# values are register numbers, numbers or label names
+LABEL = "label"
+INSTRUCTION = "instruction"
+DATA = "data"
+
+CONDITIONAL_JUMPS = ("jnz", "jzr", "jeq", "jnq")
+INSTRUCTION_SIZE = 4
+DATA_SIZES = {"db": 1, "dw": 2}
+
+
+def size(statements):
+    # (instructions, bytes) of a statement list
+    instructions = 0
+    data = 0
+    for statement in statements:
+        if statement[0] == INSTRUCTION:
+            instructions += 1
+        elif statement[0] == DATA:
+            data += DATA_SIZES[statement[1]] * len(statement[2])
+    return instructions, instructions * INSTRUCTION_SIZE + data
+
+
+def is_instruction(statement, *mnemonics):
+    return statement[0] == INSTRUCTION and statement[1] in mnemonics
+
+
+def jump_label(statement):
+    # the label a jump goes to, None for register and numeric targets
+    kind, value = statement[2][0]
+    return value if kind == IMM and isinstance(value, str) else None
+
+
+def imm_number(operand):
+    kind, value = operand
+    return value if kind == IMM and isinstance(value, int) and value <= 0xFFFF else None
+
+
+def remove_redundant(statements):
+    # nop and mov rX, rX
+    return [statement for statement in statements if not (
+        is_instruction(statement, "nop") or (is_instruction(statement, "mov") and statement[2][0] == statement[2][1]))]
+
+
+def fold_loads(statements):
+    # lod rX, a followed by add/sub rX, b becomes lod rX, a +/- b
+    result = []
+    for statement in statements:
+        previous = result[-1] if result else None
+        if previous is not None and is_instruction(statement, "add", "sub") and is_instruction(previous, "lod") and statement[2][0] == previous[2][0]:
+            loaded = imm_number(previous[2][1])
+            operand = imm_number(statement[2][1])
+            if loaded is not None and operand is not None:
+                value = loaded + operand if statement[1] == "add" else loaded - operand
+                result[-1] = (INSTRUCTION, "lod", (previous[2][0], (IMM, value & 0xFFFF)))
+                continue
+        result.append(statement)
+    return result
+
+
+def label_targets(statements):
+    # label name -> first statement after it that is not a label, None at the end
+    targets = {}
+    pending = []
+    for statement in statements:
+        if statement[0] == LABEL:
+            pending.append(statement[1])
+        else:
+            for name in pending:
+                targets[name] = statement
+            pending = []
+    for name in pending:
+        targets[name] = None
+    return targets
+
+
+def thread_jumps(statements):
+    # jumps to a jmp go straight to its target
+    targets = label_targets(statements)
+
+    def final(name):
+        seen = set()
+        while name not in seen:
+            seen.add(name)
+            target = targets.get(name)
+            if target is None or not is_instruction(target, "jmp") or jump_label(target) is None:
+                break
+            name = jump_label(target)
+        return name
+
+    result = []
+    for statement in statements:
+        if is_instruction(statement, "jmp", *CONDITIONAL_JUMPS) and jump_label(statement) is not None:
+            name = final(jump_label(statement))
+            if name != jump_label(statement):
+                statement = (INSTRUCTION, statement[1], ((IMM, name),))
+        result.append(statement)
+    return result
+
+
+def remove_unreachable(statements):
+    # instructions after a jmp up to the next label or data
+    result = []
+    reachable = True
+    for statement in statements:
+        if statement[0] != INSTRUCTION:
+            reachable = True
+        elif not reachable:
+            continue
+        result.append(statement)
+        if is_instruction(statement, "jmp"):
+            reachable = False
+    return result
+
+
+def remove_jumps_to_next(statements):
+    # jumps to a label directly behind them, taken or not execution continues there
+    result = []
+    for i, statement in enumerate(statements):
+        if is_instruction(statement, "jmp", *CONDITIONAL_JUMPS) and jump_label(statement) is not None:
+            following = set()
+            j = i + 1
+            while j < len(statements) and statements[j][0] == LABEL:
+                following.add(statements[j][1])
+                j += 1
+            if jump_label(statement) in following:
+                continue
+        result.append(statement)
+    return result
+
+
+PASSES = [remove_redundant, fold_loads, thread_jumps, remove_unreachable, remove_jumps_to_next]
+
+
+def optimize(statements):
+    # runs every pass until none of them changes anything
+    while True:
+        optimized = statements
+        for optimization in PASSES:
+            optimized = optimization(optimized)
+        if optimized == statements:
+            return optimized
+        statements = optimized
@@ -0,0 +1,91 @@
+# phase timings and counters of one assembly for main.py --stats. The report is json so a build
+# farm can track the assembler over releases, with --profile the hot functions of every phase are
+# recorded with cProfile as well
+
+import contextlib
+import cProfile
+import json
+import platform
+import pstats
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not on windows, the peak memory is left out there
+    resource = None
+
+from cache import VERSION
+
+
+class Stats:
+    def __init__(self, profile=False) -> None:
+        # phase name -> {seconds, net blocks}, in the order the phases ran
+        self.phases = {}
+        # tokens, instructions, labels, bytes, ...
+        self.counts = {}
+        self.profiler = cProfile.Profile() if profile else None
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        # net_blocks is the number of memory blocks allocated at the end of the phase minus those at
+        # its start, what it built and kept. It is no allocation count and goes negative when a
+        # phase frees more than it keeps
+        blocks = sys.getallocatedblocks()
+        if self.profiler:
+            self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.profiler:
+                self.profiler.disable()
+            self.phases[name] = {"seconds": elapsed, "net_blocks": sys.getallocatedblocks() - blocks}
+
+    def note(self, name, text):
+        # explains the numbers of a phase in the report
+        self.phases[name]["note"] = text
+
+    def count(self, **counts):
+        self.counts.update(counts)
+
+    def hot(self, top=15):
+        # the functions that took the most time themselves
+        if self.profiler is None:
+            return []
+        stats = pstats.Stats(self.profiler)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        return [{"function": "{}:{}({})".format(*function), "calls": calls, "seconds": own, "cumulative_seconds": cumulative}
+                for function, (_, calls, own, cumulative, _) in functions]
+
+    def report(self):
+        report = {
+            "assembler": VERSION,
+            "python": platform.python_version(),
+            "seconds": time.perf_counter() - self.start,
+            "phases": self.phases,
+            "counts": self.counts,
+        }
+        if resource is not None:
+            # ru_maxrss is in kilobytes on linux and in bytes on macos
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            report["peak_rss_kb"] = peak // 1024 if sys.platform == "darwin" else peak
+        if self.profiler is not None:
+            report["hot"] = self.hot()
+        return report
+
+    def write(self, path):
+        # - prints the report
+        text = json.dumps(self.report(), indent=2)
+        if path == "-":
+            print(text)
+        else:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+
+    def dump_profile(self, path):
+        # pstats file, python -m pstats <path> reads it
+        self.profiler.dump_stats(path)
@@ -0,0 +1,142 @@
+# streaming assembly for huge generated sources. The source is read in chunks of whole lines,
+# tokens are made one at a time and every item is written to the output as soon as it is encoded.
+# A forward reference is patched in the output once its label is defined, so besides the labels
+# only references to labels that are not defined yet are kept in memory
+
+import os
+import tempfile
+
+from lexer import scan
+from gen import Generator
+from image import MEMORY_END
+
+CHUNK_SIZE = 1 << 20
+
+
+def read_lines(f, chunk_size=CHUNK_SIZE):
+    # chunks of f that end on a line break, no token is ever split between two chunks
+    rest = ""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        end = chunk.rfind("\n") + 1
+        if end == 0:
+            rest += chunk
+            continue
+        yield rest + chunk[:end]
+        rest = chunk[end:]
+    if rest:
+        yield rest
+
+
+def stream_tokens(chunks):
+    # the tokens of StreamLexer, made lazily from the chunks
+    line = 1
+    for chunk in chunks:
+        tokens = scan(chunk, line)
+        yield from tokens
+        line += len(tokens.line_starts) - 1
+
+
+class StreamGenerator(Generator):
+    def __init__(self, tokens, output, ep=0x0, buffer_size=CHUNK_SIZE) -> None:
+        # the tokens are an iterator, the first one is taken when Generator sets up current_token
+        self.stream = iter(tokens)
+        # what main.py --stats reports, counted on the way since nothing is kept
+        self.tokens_read = 0
+        self.instructions = 0
+        self.data_items = 0
+        self.forward_references = 0
+        super().__init__([], ep)
+        # encoded bytes not written yet, they start at offset flushed of the output
+        self.output = output
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
+        self.flushed = 0
+        # (label name, bits) used by the item that is emitted next
+        self.waiting = []
+        # label name -> [(offset, item size, bits)] of the references to it
+        self.pending = {}
+
+    def advance(self):
+        self.current_token = next(self.stream, None)
+        if self.current_token is not None:
+            self.tokens_read += 1
+
+    def get_label(self, name, bits):
+        if name in self.labels:
+            return self.label_value(name, self.labels[name], bits)
+        self.waiting.append((name, bits))
+        self.forward_references += 1
+        return 0
+
+    def emit(self, value, size, directive):
+        offset = self.instruction_counter
+        if size == 4:
+            self.instructions += 1
+        else:
+            self.data_items += 1
+        self.buffer += value.to_bytes(size, "big")
+        self.instruction_counter += size
+        if self.waiting:
+            for name, bits in self.waiting:
+                self.pending.setdefault(name, []).append((offset, size, bits))
+            self.waiting = []
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def define(self, name):
+        if name in self.labels:
+            # earlier references could already be patched with the first address
+            raise Exception("Label " + name + " defined twice, which a streaming assembly does not support")
+        super().define(name)
+        for offset, size, bits in self.pending.pop(name, ()):
+            self.patch(offset, size, self.label_value(name, self.labels[name], bits))
+
+    def patch(self, offset, size, value):
+        if offset >= self.flushed:
+            start = offset - self.flushed
+            self.buffer[start:start + size] = (int.from_bytes(self.buffer[start:start + size], "big") | value).to_bytes(size, "big")
+        else:
+            self.output.seek(offset)
+            old = int.from_bytes(self.output.read(size), "big")
+            self.output.seek(offset)
+            self.output.write((old | value).to_bytes(size, "big"))
+            self.output.seek(0, os.SEEK_END)
+
+    def flush(self):
+        self.output.write(self.buffer)
+        self.flushed += len(self.buffer)
+        self.buffer = bytearray()
+
+    def Gen(self):
+        while self.current_token != None:
+            self.statement()
+        self.flush()
+
+        if self.pending:
+            # the first reference in the output, like a full assembly reports it
+            name = min(self.pending, key=lambda name: self.pending[name][0][0])
+            raise Exception("Invalid label: " + name)
+        return self.instruction_counter
+
+
+def assemble_stream(path, output, origin=0, limit=MEMORY_END, chunk_size=CHUNK_SIZE):
+    # assembles the file at path into the raw binary output and returns the generator with its
+    # labels and counts. The image is written under a temporary name and only replaces output once
+    # it assembled. limit=None allows images past the 64KB address space, which only makes sense
+    # for measurements
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as out, open(path, "r") as f:
+            generator = StreamGenerator(stream_tokens(read_lines(f, chunk_size)), out, origin, chunk_size)
+            size = generator.Gen()
+        if limit is not None and origin + size > limit:
+            raise Exception("Image from " + hex(origin) + " with " + str(size) + " bytes does not fit into the 64KB address space")
+        os.replace(temporary, output)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return generator
@@ -0,0 +1,244 @@
+# runs the same image on many cpus in lockstep. The state of all instances lives in numpy
+# arrays and every step executes each opcode present as one array operation over the
+# instances currently at that opcode
+
+import numpy as np
+
+from cpu import FG, FG_ZERO, FG_NOT_ZERO, FG_EQ, FG_NOT_EQ, BANK_PORT, INSTRUCTION_SIZE
+from memory import Memory, RAM_START, BANK_START, MEMORY_END, BANK_SIZE, BANK_COUNT, PAGE_SHIFT, PAGE_SIZE, PAGE_MASK, BANK_PAGE_COUNT
+from translate import JUMPS
+
+
+class BatchCPU:
+    # every instance starts from the contents of memory. Rom and the banks are shared, every
+    # instance gets its own copy of the ram and copies a bank page on its first write to it (like
+    # Memory). Writes to rom are dropped
+    def __init__(self, count, memory=None, inputs=None, bank_port=BANK_PORT) -> None:
+        memory = memory if memory is not None else Memory()
+        self.count = count
+        self.pc = np.zeros(count, dtype=np.int64)
+        self.regs = np.zeros((count, 16), dtype=np.uint16)
+        self.ram = np.tile(np.frombuffer(bytes(memory.ram), dtype=np.uint8), (count, 1))
+        self.bank = np.full(count, memory.bank, dtype=np.int64)
+        self.steps = np.zeros(count, dtype=np.int64)
+        self.halted = np.zeros(count, dtype=bool)
+        # instance x port -> value read by inp, ports outside of the array read 0
+        self.inputs = np.zeros((count, 4), dtype=np.uint16) if inputs is None else np.asarray(inputs, dtype=np.uint16)
+        self.bank_port = bank_port
+
+        self.rom = np.zeros(RAM_START + INSTRUCTION_SIZE, dtype=np.uint8)
+        self.rom[:RAM_START] = np.frombuffer(bytes(memory.rom), dtype=np.uint8)
+        # every bank image, unused banks read as 0
+        self.banks = np.zeros((BANK_COUNT, BANK_SIZE), dtype=np.uint8)
+        for number in memory.used_banks():
+            self.banks[number] = np.frombuffer(memory.get_bank(number), dtype=np.uint8)
+        # bank pages written by an instance: sorted page_key()s and the row of self.pages holding
+        # the instance's copy of each
+        self.page_keys = np.zeros(0, dtype=np.int64)
+        self.page_rows = np.zeros(0, dtype=np.int64)
+        self.pages = np.zeros((0, PAGE_SIZE), dtype=np.uint8)
+        self.page_count = 0
+
+        # rom decoded at every byte address, most code never leaves rom
+        self.rom_opcode = self.rom[:RAM_START].astype(np.int64)
+        self.rom_reg1 = (self.rom[1:RAM_START + 1] & 0xF).astype(np.int64)
+        self.rom_reg2 = (self.rom[1:RAM_START + 1] >> 4).astype(np.int64)
+        self.rom_imm = (self.rom[2:RAM_START + 2].astype(np.uint16) | self.rom[3:RAM_START + 3].astype(np.uint16) << 8)
+
+        # out events as (step, instance, port, value) arrays, one entry per step
+        self.events = []
+        self.handlers = {
+            0x01: self.mov, 0x02: self.lod, 0x03: self.out, 0x04: self.inp,
+            0x07: self.alu, 0x08: self.alu, 0x09: self.alu, 0x0a: self.alu,
+            0x0b: self.alu, 0x0c: self.alu, 0x0d: self.alu, 0x0e: self.alu,
+            0x0f: self.cmp, 0x10: self.cmp,
+            0x13: self.ldr, 0x14: self.ldr, 0x15: self.wtr, 0x16: self.wtr,
+            0x17: self.swp,
+            0x05: self.jump, 0x06: self.jump, 0x11: self.jump, 0x12: self.jump,
+            0x18: self.jump, 0x19: self.jump, 0x1a: self.jump, 0x1b: self.jump,
+            0x1c: self.jump, 0x1d: self.jump,
+        }
+        self.time = 0
+
+    def read(self, instances, addresses):
+        # one byte for each (instance, address) pair
+        values = np.zeros(len(instances), dtype=np.uint8)
+        rom = addresses < RAM_START
+        values[rom] = self.rom[addresses[rom]]
+        ram = (addresses >= RAM_START) & (addresses < BANK_START)
+        values[ram] = self.ram[instances[ram], addresses[ram] - RAM_START]
+        bank = addresses >= BANK_START
+        if bank.any():
+            instances = instances[bank]
+            banks = self.bank[instances]
+            offsets = addresses[bank] - BANK_START
+            banked = self.banks[banks, offsets]
+            if self.page_count:
+                rows = self.owned(self.page_key(instances, banks, offsets))
+                copied = rows >= 0
+                banked[copied] = self.pages[rows[copied], offsets[copied] & PAGE_MASK]
+            values[bank] = banked
+        return values
+
+    def page_key(self, instances, banks, offsets):
+        # one number for every (instance, bank, page of the bank)
+        return (instances * BANK_COUNT + banks) * BANK_PAGE_COUNT + (offsets >> PAGE_SHIFT)
+
+    def owned(self, keys):
+        # row in self.pages of every key, -1 for pages the instance did not write to yet
+        if self.page_count == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.page_keys, keys), self.page_count - 1)
+        return np.where(self.page_keys[positions] == keys, self.page_rows[positions], -1)
+
+    def write_banked(self, instances, offsets, values):
+        # writes into the bank window, copying the bank page of every instance writing it first
+        banks = self.bank[instances]
+        keys = self.page_key(instances, banks, offsets)
+        rows = self.owned(keys)
+        new = rows < 0
+        if new.any():
+            count = int(new.sum())
+            if self.page_count + count > len(self.pages):
+                pages = np.zeros((max(2 * len(self.pages), self.page_count + count, 64), PAGE_SIZE), dtype=np.uint8)
+                pages[:self.page_count] = self.pages[:self.page_count]
+                self.pages = pages
+            starts = offsets[new] & ~PAGE_MASK
+            self.pages[self.page_count:self.page_count + count] = self.banks[banks[new][:, None], starts[:, None] + np.arange(PAGE_SIZE)]
+            rows[new] = np.arange(self.page_count, self.page_count + count)
+            self.page_count += count
+            keys = np.concatenate((self.page_keys, keys[new]))
+            order = np.argsort(keys, kind="stable")
+            self.page_keys = keys[order]
+            self.page_rows = np.concatenate((self.page_rows, rows[new]))[order]
+        self.pages[rows, offsets & PAGE_MASK] = values
+
+    def get_bank(self, instance, bank):
+        # contents of a bank as the instance sees it
+        data = self.banks[bank].copy()
+        first = (instance * BANK_COUNT + bank) * BANK_PAGE_COUNT
+        for page in range(BANK_PAGE_COUNT):
+            row = self.owned(np.array([first + page]))[0]
+            if row >= 0:
+                data[page << PAGE_SHIFT:(page + 1) << PAGE_SHIFT] = self.pages[row]
+        return bytes(data)
+
+    def fetch(self, instances, pc):
+        if pc.max() <= RAM_START - INSTRUCTION_SIZE:
+            return self.rom_opcode[pc], self.rom_reg1[pc], self.rom_reg2[pc], self.rom_imm[pc]
+
+        word = [self.read(instances, (pc + i) & 0xFFFF).astype(np.int64) for i in range(INSTRUCTION_SIZE)]
+        return word[0], word[1] & 0xF, word[1] >> 4, (word[2] | word[3] << 8).astype(np.uint16)
+
+    def mov(self, opcode, i, r1, r2, imm, pc, next):
+        self.regs[i, r1] = self.regs[i, r2]
+
+    def lod(self, opcode, i, r1, r2, imm, pc, next):
+        self.regs[i, r1] = imm
+
+    def out(self, opcode, i, r1, r2, imm, pc, next):
+        values = self.regs[i, r2]
+        self.events.append((np.full(len(i), self.time), i, imm.astype(np.int64), values))
+        bank = imm == self.bank_port
+        self.bank[i[bank]] = values[bank] & (BANK_COUNT - 1)
+
+    def inp(self, opcode, i, r1, r2, imm, pc, next):
+        ports = imm.astype(np.int64)
+        known = ports < self.inputs.shape[1]
+        values = np.zeros(len(i), dtype=np.uint16)
+        values[known] = self.inputs[i[known], ports[known]]
+        self.regs[i, r1] = values
+
+    def alu(self, opcode, i, r1, r2, imm, pc, next):
+        a = self.regs[i, r1]
+        # even opcodes take the imm16 as second operand
+        b = imm if opcode % 2 == 0 else self.regs[i, r2]
+        operation = (opcode - 0x07) // 2
+        if operation == 0:
+            result = a + b
+        elif operation == 1:
+            result = a - b
+        elif operation == 2:
+            result = ~(a & b)
+        else:
+            result = ~(a | b)
+        self.regs[i, r1] = result
+
+    def cmp(self, opcode, i, r1, r2, imm, pc, next):
+        a = self.regs[i, r1]
+        b = imm if opcode == 0x10 else self.regs[i, r2]
+        self.regs[i, FG] = np.where(a == b, FG_EQ, FG_NOT_EQ) | np.where(a == 0, FG_ZERO, FG_NOT_ZERO)
+
+    def ldr(self, opcode, i, r1, r2, imm, pc, next):
+        addresses = (imm if opcode == 0x13 else self.regs[i, r2]).astype(np.int64)
+        self.regs[i, r1] = self.read(i, addresses)
+
+    def wtr(self, opcode, i, r1, r2, imm, pc, next):
+        addresses = (imm if opcode == 0x15 else self.regs[i, r2]).astype(np.int64)
+        values = (self.regs[i, r1] & 0xFF).astype(np.uint8)
+        ram = (addresses >= RAM_START) & (addresses < BANK_START)
+        self.ram[i[ram], addresses[ram] - RAM_START] = values[ram]
+        bank = addresses >= BANK_START
+        if bank.any():
+            self.write_banked(i[bank], addresses[bank] - BANK_START, values[bank])
+
+    def swp(self, opcode, i, r1, r2, imm, pc, next):
+        value = self.regs[i, r1]
+        self.regs[i, r1] = (value & 0xFF) << 8 | value >> 8
+
+    def jump(self, opcode, i, r1, r2, imm, pc, next):
+        flag, indirect = JUMPS[opcode]
+        target = (self.regs[i, r2] if indirect else imm).astype(np.int64)
+        if flag is not None:
+            target = np.where(self.regs[i, FG] & flag, target, next)
+        return target
+
+    def step(self, active):
+        # executes one instruction on the given instances
+        pc = self.pc[active]
+        opcode, r1, r2, imm = self.fetch(active, pc)
+        next = (pc + INSTRUCTION_SIZE) & 0xFFFF
+        new_pc = next.copy()
+
+        # group the instances by opcode, every group is one contiguous run of order
+        order = np.argsort(opcode, kind="stable")
+        sorted_opcodes = opcode[order]
+        bounds = np.flatnonzero(np.diff(sorted_opcodes)) + 1
+        for group in np.split(order, bounds):
+            op = int(opcode[group[0]])
+            handler = self.handlers.get(op)
+            if handler is None:
+                # nop and unknown opcodes
+                continue
+            target = handler(op, active[group], r1[group], r2[group], imm[group], pc[group], next[group])
+            if target is not None:
+                new_pc[group] = target
+
+        self.halted[active] = new_pc == pc
+        self.pc[active] = new_pc
+        self.steps[active] += 1
+        self.time += 1
+
+    def run(self, max_steps, end=MEMORY_END):
+        # runs until every instance halted, reached end or executed max_steps more instructions.
+        # Like CPU.run every call starts out not halted, counts its steps from where it starts and
+        # executes the first instruction even at or past end
+        start = self.steps.copy()
+        self.halted[:] = False
+        active = np.arange(self.count)
+        for _ in range(max_steps):
+            if len(active) == 0:
+                break
+            self.step(active)
+            active = np.flatnonzero(~self.halted & (self.pc < end) & (self.steps - start < max_steps))
+
+    def out_traces(self):
+        # every instance's list of (port, value) written by out, in order
+        traces = [[] for _ in range(self.count)]
+        if not self.events:
+            return traces
+        time, instances, ports, values = (np.concatenate(column) for column in zip(*self.events))
+        order = np.lexsort((time, instances))
+        for instance, port, value in zip(instances[order].tolist(), ports[order].tolist(), values[order].tolist()):
+            traces[instance].append((port, value))
+        return traces
@@ -0,0 +1,241 @@
+# python reference emulator of the cpu, mirrors cpu_tick() in emu.c and cpu_spec.txt
+
+from memory import Memory, BANK_START, MEMORY_END
+
+FG_ZERO = 1 << 0
+FG_NOT_ZERO = 1 << 1
+FG_EQ = 1 << 2
+FG_NOT_EQ = 1 << 3
+FG_OVERFLOW = 1 << 4
+
+# register numbers, see cpu_spec.txt. The flags live in the register file at FG
+SP = 12
+FG = 14
+REGISTER_NAMES = ["r0", "r1", "r2", "unk", "unk", "unk", "unk", "unk", "unk", "unk", "unk", "unk", "sp", "unk", "fg", "unk"]
+
+# the io port whose value selects the bank mapped at 0xc000 - 0xffff
+BANK_PORT = 0x3
+
+INSTRUCTION_SIZE = 4
+
+
+def decode(word):
+    # (opcode, reg1, reg2, imm16) of the 4 instruction bytes. imm16 is stored little endian
+    return word[0], word[1] & 0xF, word[1] >> 4, word[2] | word[3] << 8
+
+
+class CPU:
+    def __init__(self, memory=None, inputs=None, bank_port=BANK_PORT) -> None:
+        self.memory = memory if memory is not None else Memory()
+        self.pc = 0
+        self.regs = [0] * 16
+        # port -> value read by inp
+        self.inputs = inputs if inputs is not None else {}
+        # port -> last value written by out, and every (port, value) written in order
+        self.outputs = {}
+        self.out_trace = []
+        self.bank_port = bank_port
+        self.steps = 0
+        self.halted = False
+
+        # address -> (handler, reg1, reg2, imm16, address of the next instruction), filled on first execution.
+        # A dict, so a machine only pays for the instructions it ran
+        self.decoded = {}
+        self.handlers = self.make_handlers()
+
+    def make_handlers(self):
+        # every handler takes (reg1, reg2, imm16, next pc) and returns the pc to continue at
+        regs = self.regs
+        read = self.memory.read
+        store = self.store
+        output = self.output
+
+        def nop(r1, r2, imm, next):
+            return next
+
+        def mov(r1, r2, imm, next):
+            regs[r1] = regs[r2]
+            return next
+
+        def lod(r1, r2, imm, next):
+            regs[r1] = imm
+            return next
+
+        def out(r1, r2, imm, next):
+            output(imm, regs[r2])
+            return next
+
+        def inp(r1, r2, imm, next):
+            regs[r1] = self.inputs.get(imm, 0) & 0xFFFF
+            return next
+
+        def add(r1, r2, imm, next):
+            regs[r1] = regs[r1] + regs[r2] & 0xFFFF
+            return next
+
+        def add_imm(r1, r2, imm, next):
+            regs[r1] = regs[r1] + imm & 0xFFFF
+            return next
+
+        def sub(r1, r2, imm, next):
+            regs[r1] = regs[r1] - regs[r2] & 0xFFFF
+            return next
+
+        def sub_imm(r1, r2, imm, next):
+            regs[r1] = regs[r1] - imm & 0xFFFF
+            return next
+
+        def nad(r1, r2, imm, next):
+            regs[r1] = ~(regs[r1] & regs[r2]) & 0xFFFF
+            return next
+
+        def nad_imm(r1, r2, imm, next):
+            regs[r1] = ~(regs[r1] & imm) & 0xFFFF
+            return next
+
+        def nor(r1, r2, imm, next):
+            regs[r1] = ~(regs[r1] | regs[r2]) & 0xFFFF
+            return next
+
+        def nor_imm(r1, r2, imm, next):
+            regs[r1] = ~(regs[r1] | imm) & 0xFFFF
+            return next
+
+        def cmp(r1, r2, imm, next):
+            value = regs[r1]
+            regs[FG] = (FG_EQ if value == regs[r2] else FG_NOT_EQ) | (FG_ZERO if value == 0 else FG_NOT_ZERO)
+            return next
+
+        def cmp_imm(r1, r2, imm, next):
+            value = regs[r1]
+            regs[FG] = (FG_EQ if value == imm else FG_NOT_EQ) | (FG_ZERO if value == 0 else FG_NOT_ZERO)
+            return next
+
+        def ldr(r1, r2, imm, next):
+            regs[r1] = read(imm)
+            return next
+
+        def ldr_reg(r1, r2, imm, next):
+            regs[r1] = read(regs[r2])
+            return next
+
+        def wtr(r1, r2, imm, next):
+            store(imm, regs[r1])
+            return next
+
+        def wtr_reg(r1, r2, imm, next):
+            store(regs[r2], regs[r1])
+            return next
+
+        def swp(r1, r2, imm, next):
+            value = regs[r1]
+            regs[r1] = (value & 0xFF) << 8 | value >> 8
+            return next
+
+        def jmp(r1, r2, imm, next):
+            return imm
+
+        def jmp_reg(r1, r2, imm, next):
+            return regs[r2]
+
+        def jump_if(flag):
+            def jump(r1, r2, imm, next):
+                return imm if regs[FG] & flag else next
+            return jump
+
+        def jump_reg_if(flag):
+            def jump(r1, r2, imm, next):
+                return regs[r2] if regs[FG] & flag else next
+            return jump
+
+        # unknown opcodes do nothing, like the default case in emu.c
+        handlers = [nop] * 256
+        handlers[0x00:0x1e] = [
+            nop, mov, lod, out, inp,
+            jump_if(FG_NOT_ZERO), jump_reg_if(FG_NOT_ZERO),
+            add, add_imm, sub, sub_imm, nad, nad_imm, nor, nor_imm, cmp, cmp_imm,
+            jump_if(FG_ZERO), jump_reg_if(FG_ZERO),
+            ldr, ldr_reg, wtr, wtr_reg, swp,
+            jmp, jmp_reg,
+            jump_if(FG_EQ), jump_reg_if(FG_EQ),
+            jump_if(FG_NOT_EQ), jump_reg_if(FG_NOT_EQ),
+        ]
+        return handlers
+
+    def decode(self, address):
+        opcode, r1, r2, imm = decode(self.memory.fetch(address))
+        entry = self.decoded[address] = (self.handlers[opcode], r1, r2, imm, (address + INSTRUCTION_SIZE) & 0xFFFF)
+        return entry
+
+    def invalidate(self, start, stop):
+        decoded = self.decoded
+        if stop - start <= len(decoded):
+            for address in range(start, stop):
+                decoded.pop(address, None)
+        else:
+            for address in [address for address in decoded if start <= address < stop]:
+                del decoded[address]
+
+    def store(self, address, value):
+        if self.memory.write(address, value):
+            # an instruction starting up to 3 bytes before address (wrapping around) may contain it
+            pop = self.decoded.pop
+            pop(address, None)
+            pop(address - 1 & 0xFFFF, None)
+            pop(address - 2 & 0xFFFF, None)
+            pop(address - 3 & 0xFFFF, None)
+
+    def output(self, port, value):
+        self.outputs[port] = value
+        self.out_trace.append((port, value))
+        if port == self.bank_port:
+            self.memory.select(value)
+            # code in the banked window belongs to the old bank
+            self.invalidate(BANK_START, MEMORY_END)
+
+    def run(self, max_steps=1 << 62, end=MEMORY_END):
+        # executes until max_steps instructions ran, pc reaches end or higher (like emu.c) or
+        # the cpu halts by jumping to the instruction itself. Returns the number of executed instructions
+        cached = self.decoded.get
+        pc = self.pc
+        steps = 0
+        self.halted = False
+
+        for steps in range(1, max_steps + 1):
+            entry = cached(pc)
+            if entry is None:
+                entry = self.decode(pc)
+            handler, r1, r2, imm, next = entry
+            target = handler(r1, r2, imm, next)
+            if target == pc:
+                self.halted = True
+                break
+            pc = target
+            if pc >= end:
+                break
+
+        self.pc = pc
+        self.steps += steps
+        return steps
+
+    def step(self):
+        return self.run(1)
+
+    def snapshot(self):
+        # registers, outputs and a copy on write snapshot of the memory
+        return (self.memory.snapshot(), self.pc, self.regs[:], self.steps, len(self.out_trace), dict(self.outputs))
+
+    def restore(self, snapshot):
+        memory, self.pc, regs, self.steps, trace_length, outputs = snapshot
+        # the handlers hold on to the register list
+        self.regs[:] = regs
+        self.outputs = dict(outputs)
+        del self.out_trace[trace_length:]
+        self.halted = False
+        for start, stop in self.memory.restore(memory):
+            self.invalidate(start, stop)
+
+    def dump_state(self):
+        flags = [name for flag, name in ((FG_EQ, "FG_EQ"), (FG_NOT_EQ, "FG_NOT_EQ"), (FG_ZERO, "FG_ZERO"), (FG_NOT_ZERO, "FG_NOT_ZERO"), (FG_OVERFLOW, "FG_OVERFLOW")) if self.regs[FG] & flag]
+        registers = ", ".join("{}: 0x{:x}".format(REGISTER_NAMES[i], self.regs[i]) for i in (0, 1, 2, SP))
+        return "---- CPU STATE ----\nPC: 0x{:x}\nFG: {}\n{}\n-------------------\n".format(self.pc, " ".join(flags), registers)
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+from cpu import CPU, decode
+from memory import Memory
+from translate import TranslatingCPU
+from profiler import ProfilingCPU, sample
+
+# the symbol map format lives in the assembler's image module, next to symbol_lines() that writes
+# it, so the two can not drift apart. Assembler/ and Emulator/ are plain script directories, not
+# packages, so it is found through the path like bin_to_c_header.py does. Appended rather than
+# inserted: batch.py exists in both and the emulator's own modules have to come first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+from image import read_symbols
+
+if __name__=="__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rom", type=str)
+    parser.add_argument("--end", type=str, default="0x10000", help="stop once pc reaches this address (like emu.c)")
+    parser.add_argument("--max-steps", type=int, default=1 << 62)
+    parser.add_argument("--offset", type=str, default="0x0", help="address the image is loaded at")
+    parser.add_argument("--bank", type=int, default=0, help="bank that gets the part of the image in 0xc000 - 0xffff")
+    parser.add_argument("--input", type=str, action="append", default=[], help="port=value read by inp, can be repeated")
+    parser.add_argument("--trace", action="store_true", help="print every executed instruction and the state after it")
+    parser.add_argument("--translate", action="store_true", help="compile basic blocks into python functions instead of interpreting")
+    parser.add_argument("--profile", action="store_true", help="count instructions and microcode cycles of every instruction and print the hot spots")
+    parser.add_argument("--sample", type=int, default=0, help="profile by sampling the pc about every n instructions instead")
+    parser.add_argument("--symbols", type=str, help="symbol map from the assembler (--symbols) to group the profile by label")
+    parser.add_argument("--clock", type=float, help="clock of the real cpu in hz, adds the time spent to the profile")
+    parser.add_argument("--top", type=int, default=20, help="number of labels in the profile")
+
+    args = parser.parse_args()
+
+    memory = Memory()
+    with open(args.rom, "rb") as f:
+        memory.load(f.read(), int(args.offset, base=16), args.bank)
+
+    inputs = {}
+    for i in args.input:
+        port, value = i.split("=")
+        inputs[int(port, base=0)] = int(value, base=0)
+
+    symbols = read_symbols(args.symbols) if args.symbols else ()
+    if args.profile:
+        cpu = ProfilingCPU(memory, inputs, symbols)
+    else:
+        cpu = (TranslatingCPU if args.translate else CPU)(memory, inputs)
+    end = int(args.end, base=16)
+    profile = cpu.profile if args.profile else None
+
+    if args.sample:
+        profile = sample(cpu, args.sample, args.max_steps, end, symbols)
+        print(cpu.dump_state())
+    elif args.trace:
+        for _ in range(args.max_steps):
+            print("0x{:x}: 0x{:x} 0x{:x} 0x{:x} 0x{:x}".format(cpu.pc, *decode(memory.fetch(cpu.pc))))
+            cpu.step()
+            print(cpu.dump_state())
+            if cpu.halted or cpu.pc >= end:
+                break
+    else:
+        cpu.run(args.max_steps, end)
+        print(cpu.dump_state())
+
+    for port, value in cpu.out_trace:
+        print("out 0x{:x}: 0x{:x}".format(port, value))
+    print("{} instructions{}".format(cpu.steps, ", halted" if cpu.halted else ""))
+
+    if profile is not None:
+        print()
+        print("\n".join(profile.report(args.top, args.clock)))
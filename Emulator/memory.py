@@ -0,0 +1,183 @@
+# address space of the cpu, see cpu_spec.txt
+#
+# memory is made of 256 byte pages. Pages nobody wrote to are immutable bytes objects shared
+# between machines and snapshots, the first write to one copies it into a bytearray owned by
+# this machine. Bank pages only exist once written or loaded
+
+ROM_START = 0x0000
+RAM_START = 0x8000
+BANK_START = 0xc000
+MEMORY_END = 0x10000
+BANK_SIZE = 0x4000
+BANK_COUNT = 256
+
+PAGE_SHIFT = 8
+PAGE_SIZE = 1 << PAGE_SHIFT
+PAGE_MASK = PAGE_SIZE - 1
+ZERO_PAGE = bytes(PAGE_SIZE)
+
+# physical page numbers: rom and ram keep their address, bank b page i is BANK_PAGES + b * BANK_PAGE_COUNT + i
+WINDOW_PAGE = BANK_START >> PAGE_SHIFT
+BANK_PAGES = MEMORY_END >> PAGE_SHIFT
+BANK_PAGE_COUNT = BANK_SIZE >> PAGE_SHIFT
+
+
+def mapped_at(page):
+    # address >> PAGE_SHIFT a physical page shows up at when it is mapped
+    return page if page < BANK_PAGES else WINDOW_PAGE + (page - BANK_PAGES) % BANK_PAGE_COUNT
+
+
+class Snapshot:
+    __slots__ = ("undo", "bank")
+
+    def __init__(self, bank) -> None:
+        # physical page -> page as it was when the snapshot was taken (None if it did not exist), filled on
+        # the first write to every page after it
+        self.undo = {}
+        self.bank = bank
+
+
+class Memory:
+    def __init__(self, pages=None) -> None:
+        # physical page -> contents, missing pages read as 0
+        self.pages = pages if pages is not None else {}
+        # snapshots from oldest to newest, writes are undone into the newest
+        self.snapshots = []
+        # physical pages copied into bytearrays since the last snapshot
+        self.dirty = set()
+        self.bank = 0
+        # address >> PAGE_SHIFT -> physical page and its contents in the current mapping
+        self.physical = list(range(WINDOW_PAGE)) + [0] * (BANK_PAGES - WINDOW_PAGE)
+        self.map = [self.pages.get(page, ZERO_PAGE) for page in range(BANK_PAGES)]
+        self.select(0)
+
+    @property
+    def rom(self):
+        return self.contents(ROM_START, RAM_START)
+
+    @property
+    def ram(self):
+        return self.contents(RAM_START, BANK_START)
+
+    def contents(self, start, stop):
+        # bytes currently mapped at start - stop, both page aligned
+        return b"".join(self.map[start >> PAGE_SHIFT:stop >> PAGE_SHIFT])
+
+    def used_banks(self):
+        return sorted({(page - BANK_PAGES) // BANK_PAGE_COUNT for page in self.pages if page >= BANK_PAGES})
+
+    def get_bank(self, bank):
+        first = BANK_PAGES + bank * BANK_PAGE_COUNT
+        return b"".join(self.pages.get(page, ZERO_PAGE) for page in range(first, first + BANK_PAGE_COUNT))
+
+    def select(self, bank):
+        self.bank = bank & (BANK_COUNT - 1)
+        first = BANK_PAGES + self.bank * BANK_PAGE_COUNT
+        pages = self.pages
+        for i in range(BANK_PAGE_COUNT):
+            self.physical[WINDOW_PAGE + i] = first + i
+            self.map[WINDOW_PAGE + i] = pages.get(first + i, ZERO_PAGE)
+
+    def put(self, page, contents):
+        # replaces a physical page, remembering the old one for the newest snapshot
+        if self.snapshots:
+            undo = self.snapshots[-1].undo
+            if page not in undo:
+                undo[page] = self.pages.get(page)
+        self.pages[page] = contents
+        index = mapped_at(page)
+        if self.physical[index] == page:
+            self.map[index] = contents
+
+    def load(self, data, origin=0, bank=0):
+        # places an image at origin. Everything from 0xc000 on goes into the given bank
+        end = origin + len(data)
+        for index in range(origin >> PAGE_SHIFT, min((end + PAGE_MASK) >> PAGE_SHIFT, BANK_PAGES)):
+            page = index if index < WINDOW_PAGE else BANK_PAGES + bank * BANK_PAGE_COUNT + index - WINDOW_PAGE
+            start = index << PAGE_SHIFT
+            lo = max(start, origin)
+            hi = min(start + PAGE_SIZE, end)
+            contents = bytearray(self.pages.get(page, ZERO_PAGE))
+            contents[lo - start:hi - start] = data[lo - origin:hi - origin]
+            self.put(page, bytes(contents))
+
+    def read(self, address):
+        return self.map[address >> PAGE_SHIFT][address & PAGE_MASK]
+
+    def write(self, address, value):
+        # returns False if the write was dropped because the address is rom
+        if address < RAM_START:
+            return False
+        contents = self.map[address >> PAGE_SHIFT]
+        if contents.__class__ is not bytearray:
+            # shared page, copy it on the first write
+            contents = bytearray(contents)
+            page = self.physical[address >> PAGE_SHIFT]
+            self.put(page, contents)
+            self.dirty.add(page)
+        contents[address & PAGE_MASK] = value & 0xFF
+        return True
+
+    def fetch(self, address):
+        # the 4 bytes of the instruction at address, wrapping around at the end of the address space
+        contents = self.map[address >> PAGE_SHIFT]
+        offset = address & PAGE_MASK
+        if offset <= PAGE_SIZE - 4:
+            return bytes(contents[offset:offset + 4])
+        return bytes(self.read((address + i) & 0xFFFF) for i in range(4))
+
+    def freeze(self):
+        # makes every page written since the last snapshot shared again
+        for page in self.dirty:
+            contents = self.pages[page] = bytes(self.pages[page])
+            index = mapped_at(page)
+            if self.physical[index] == page:
+                self.map[index] = contents
+        self.dirty.clear()
+
+    def snapshot(self):
+        # costs one copy of every page written since the previous snapshot
+        self.freeze()
+        snapshot = Snapshot(self.bank)
+        self.snapshots.append(snapshot)
+        return snapshot
+
+    def restore(self, snapshot):
+        # goes back to the state at snapshot, which stays valid and can be restored again. Snapshots
+        # taken after it are dropped. Returns the addresses whose contents may have changed as
+        # (start, stop) ranges
+        if not any(taken is snapshot for taken in self.snapshots):
+            raise Exception("Snapshot was dropped by restoring an older one or belongs to another machine")
+        changed = set()
+        while True:
+            newest = self.snapshots[-1]
+            for page, contents in newest.undo.items():
+                changed.add(page)
+                if contents is None:
+                    del self.pages[page]
+                else:
+                    self.pages[page] = contents
+            newest.undo = {}
+            if newest is snapshot:
+                break
+            self.snapshots.pop()
+
+        # every page written since snapshot was copied after it, nothing is dirty anymore
+        self.dirty.clear()
+        bank_changed = snapshot.bank != self.bank
+        self.select(snapshot.bank)
+        ranges = [(BANK_START, MEMORY_END)] if bank_changed else []
+        for page in sorted(changed):
+            index = mapped_at(page)
+            if self.physical[index] == page:
+                self.map[index] = self.pages.get(page, ZERO_PAGE)
+                if index < WINDOW_PAGE or not bank_changed:
+                    ranges.append((index << PAGE_SHIFT, (index + 1) << PAGE_SHIFT))
+        return ranges
+
+    def fork(self):
+        # a new machine starting from the current contents, sharing every page with this one
+        self.freeze()
+        memory = Memory(dict(self.pages))
+        memory.select(self.bank)
+        return memory
@@ -0,0 +1,203 @@
+# cycle level profiler. Counts executed instructions and microcode cycles per address and sums
+# them up per label of the symbol map the assembler writes with --symbols
+
+import random
+from bisect import bisect_right
+
+from cpu import CPU, INSTRUCTION_SIZE, decode
+from memory import MEMORY_END
+
+# control word bits of the three microcode eeproms, see microcode.c
+REG1_READ = 0b00000001
+REG2_READ = 0b00000010
+REG2_TO_REG_WRITE_DATA = 0b00001000
+DATA_BUS_TO_REG_WRITE_DATA = 0b00010000
+IMM16_TO_REG_WRITE_DATA = 0b00100000
+ALU_ADD = 0b01000000
+ALU_SUB = 0b10000000
+
+ALU_NOR = 0b00000001
+ALU_NAND = 0b00000010
+IMM16_TO_REG2_DATA = 0b00000100
+REG2_TO_ADDRESS_BUS = 0b00001000
+ALU_COMPARE = 0b00010000
+ALU_SWAP = 0b00100000
+COND_INVERT = 0b01000000
+IO_READ = 0b10000000
+
+REG1_WRITE = 0b00000001
+PC_COUNT_WRITE = 0b00000100
+FLAGS_WRITE = 0b00001000
+MEMORY_WRITE = 0b00010000
+PC_COUNT_LOAD_ZERO = 0b00100000
+PC_COUNT_LOAD_EQ = 0b01000000
+IO_WRITE = 0b10000000
+
+# opcode -> control words of eeprom 1, 2 and 3, copied from microcode.c
+MICROCODE = [(0, 0, 0)] * 256
+MICROCODE[0x00:0x1e] = [
+    (0, 0, 0),  # NOP
+    (REG2_READ | REG2_TO_REG_WRITE_DATA, 0, REG1_WRITE),  # MOV <reg> <reg>
+    (IMM16_TO_REG_WRITE_DATA, 0, REG1_WRITE),  # LOD <reg> <imm16>
+    (REG2_READ | REG2_TO_ADDRESS_BUS, IMM16_TO_REG2_DATA, IO_WRITE),  # OUT <imm16> <reg>
+    (0, IMM16_TO_REG2_DATA | IO_READ, REG1_WRITE),  # INP <imm16> <reg>
+    (0, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS | COND_INVERT, PC_COUNT_LOAD_ZERO),  # JNZ <imm16>
+    (REG2_READ, REG2_TO_ADDRESS_BUS | COND_INVERT, PC_COUNT_LOAD_ZERO),  # JNZ <reg>
+    (REG1_READ | REG2_READ | ALU_ADD, 0, REG1_WRITE),  # ADD <reg> <reg>
+    (REG1_READ | ALU_ADD, IMM16_TO_REG2_DATA, REG1_WRITE),  # ADD <reg> <imm16>
+    (REG1_READ | REG2_READ | ALU_SUB, 0, REG1_WRITE),  # SUB <reg> <reg>
+    (REG1_READ | ALU_SUB, IMM16_TO_REG2_DATA, REG1_WRITE),  # SUB <reg> <imm16>
+    (REG1_READ | REG2_READ, ALU_NAND, REG1_WRITE),  # NAD <reg> <reg>
+    (REG1_READ, ALU_NAND | IMM16_TO_REG2_DATA, REG1_WRITE),  # NAD <reg> <imm16>
+    (REG1_READ | REG2_READ, ALU_NOR, REG1_WRITE),  # NOR <reg> <reg>
+    (REG1_READ, ALU_NOR | IMM16_TO_REG2_DATA, REG1_WRITE),  # NOR <reg> <imm16>
+    (REG1_READ | REG2_READ, ALU_COMPARE, FLAGS_WRITE),  # CMP <reg> <reg>
+    (REG1_READ, IMM16_TO_REG2_DATA | ALU_COMPARE, FLAGS_WRITE),  # CMP <reg> <imm16>
+    (0, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS, PC_COUNT_LOAD_ZERO),  # JZR <imm16>
+    (REG2_READ, REG2_TO_ADDRESS_BUS, PC_COUNT_LOAD_ZERO),  # JZR <reg>
+    (DATA_BUS_TO_REG_WRITE_DATA, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS, REG1_WRITE),  # LDR <reg> <imm16>
+    (REG2_READ | DATA_BUS_TO_REG_WRITE_DATA, REG2_TO_ADDRESS_BUS, REG1_WRITE),  # LDR <reg> <reg>
+    (REG1_READ, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS, MEMORY_WRITE),  # WTR <reg> <imm16>
+    (REG1_READ | REG2_READ, REG2_TO_ADDRESS_BUS, MEMORY_WRITE),  # WTR <reg> <reg>
+    (REG1_READ, ALU_SWAP, REG1_WRITE),  # SWP <reg>
+    (0, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS, PC_COUNT_WRITE),  # JMP <imm16>
+    (REG2_READ, REG2_TO_ADDRESS_BUS, PC_COUNT_WRITE),  # JMP <reg>
+    (0, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS, PC_COUNT_LOAD_EQ),  # JEQ <imm16>
+    (REG2_READ, REG2_TO_ADDRESS_BUS, PC_COUNT_LOAD_EQ),  # JEQ <reg>
+    (0, IMM16_TO_REG2_DATA | REG2_TO_ADDRESS_BUS | COND_INVERT, PC_COUNT_LOAD_EQ),  # JNQ <imm16>
+    (REG2_READ, REG2_TO_ADDRESS_BUS | COND_INVERT | PC_COUNT_LOAD_EQ, 0),  # JNQ <reg>, as in microcode.c
+]
+
+# cycle model of the breadboard: the 4 instruction bytes are fetched one per clock, the control word
+# executes in one more and every access over the data bus (memory or io) takes another
+FETCH_CYCLES = INSTRUCTION_SIZE
+EXECUTE_CYCLES = 1
+BUS_CYCLES = 1
+
+
+def cycles(word):
+    first, second, third = word
+    bus = first & DATA_BUS_TO_REG_WRITE_DATA or second & IO_READ or third & (MEMORY_WRITE | IO_WRITE)
+    return FETCH_CYCLES + EXECUTE_CYCLES + (BUS_CYCLES if bus else 0)
+
+
+CYCLES = [cycles(word) for word in MICROCODE]
+
+# jumps that take their target from a register, used for returns
+INDIRECT_JUMPS = {0x06, 0x12, 0x19, 0x1b, 0x1d}
+
+
+class Profile:
+    def __init__(self, symbols=()) -> None:
+        # address -> executed instructions and cycles
+        self.counts = [0] * MEMORY_END
+        self.cycles = [0] * MEMORY_END
+        # (jump address, target) -> times taken, and the jump addresses whose target was a register
+        self.edges = {}
+        self.indirect = set()
+        self.symbols = sorted(symbols)
+        self.addresses = [address for address, name in self.symbols]
+
+    def label(self, address):
+        # the label an address belongs to, which is the closest one at or before it
+        i = bisect_right(self.addresses, address) - 1
+        return self.symbols[i][1] if i >= 0 else "0x{:04x}".format(address)
+
+    def flat(self):
+        # [label, instructions, cycles] sorted by cycles
+        labels = {}
+        for address in range(MEMORY_END):
+            if self.counts[address]:
+                entry = labels.setdefault(self.label(address), [0, 0])
+                entry[0] += self.counts[address]
+                entry[1] += self.cycles[address]
+        return sorted(([name, count, cycles] for name, (count, cycles) in labels.items()), key=lambda entry: -entry[2])
+
+    def calls(self):
+        # [from label, to label, times taken, indirect] of the taken jumps between different labels
+        calls = {}
+        for (source, target), count in self.edges.items():
+            key = (self.label(source), self.label(target), source in self.indirect)
+            if key[0] != key[1]:
+                calls[key] = calls.get(key, 0) + count
+        return sorted(([source, target, count, indirect] for (source, target, indirect), count in calls.items()), key=lambda entry: -entry[2])
+
+    def report(self, top=20, clock=None):
+        total = sum(self.cycles) or 1
+        lines = ["{:>12} {:>6} {:>12} {:>10}  label".format("cycles", "%", "instructions", "seconds" if clock else "")]
+        for name, count, cycles in self.flat()[:top]:
+            seconds = "{:10.4f}".format(cycles / clock) if clock else ""
+            lines.append("{:>12} {:6.2f} {:>12} {:>10}  {}".format(cycles, cycles * 100 / total, count, seconds, name))
+
+        calls = self.calls()
+        if calls:
+            lines.append("")
+            lines.append("{:>12}  jumps between labels (* target from a register, e.g. a return)".format("taken"))
+            for source, target, count, indirect in calls[:top]:
+                lines.append("{:>12}  {} -> {}{}".format(count, source, target, " *" if indirect else ""))
+        return lines
+
+
+class ProfilingCPU(CPU):
+    # the interpreter with every instruction and taken jump counted
+    def __init__(self, memory=None, inputs=None, symbols=(), **kwargs) -> None:
+        super().__init__(memory, inputs, **kwargs)
+        self.profile = Profile(symbols)
+        # address -> (cycles, opcode) of the decoded instruction
+        self.costs = {}
+
+    def decode(self, address):
+        opcode = self.memory.read(address)
+        self.costs[address] = (CYCLES[opcode], opcode)
+        return super().decode(address)
+
+    def run(self, max_steps=1 << 62, end=MEMORY_END):
+        cached = self.decoded.get
+        costs = self.costs
+        counts = self.profile.counts
+        cycles = self.profile.cycles
+        edges = self.profile.edges
+        pc = self.pc
+        steps = 0
+        self.halted = False
+
+        for steps in range(1, max_steps + 1):
+            entry = cached(pc)
+            if entry is None:
+                entry = self.decode(pc)
+            handler, r1, r2, imm, next = entry
+            counts[pc] += 1
+            cycles[pc] += costs[pc][0]
+            target = handler(r1, r2, imm, next)
+            if target != next:
+                edges[pc, target] = edges.get((pc, target), 0) + 1
+                if costs[pc][1] in INDIRECT_JUMPS:
+                    self.profile.indirect.add(pc)
+            if target == pc:
+                self.halted = True
+                break
+            pc = target
+            if pc >= end:
+                break
+
+        self.pc = pc
+        self.steps += steps
+        return steps
+
+
+def sample(cpu, interval, max_steps=1 << 62, end=MEMORY_END, symbols=(), seed=0):
+    # statistical profile of any cpu: it runs at full speed for about interval instructions at a time
+    # and the whole stretch is charged to the instruction it stopped at. The stretch length is
+    # jittered so loops whose length divides interval are not always caught at the same address
+    profile = Profile(symbols)
+    rng = random.Random(seed)
+    total = 0
+    while total < max_steps:
+        executed = cpu.run(min(rng.randint(interval // 2 + 1, interval + interval // 2), max_steps - total), end)
+        total += executed
+        opcode = decode(cpu.memory.fetch(cpu.pc))[0]
+        profile.counts[cpu.pc] += executed
+        profile.cycles[cpu.pc] += executed * CYCLES[opcode]
+        if cpu.halted or cpu.pc >= end or executed == 0:
+            break
+    return profile
@@ -0,0 +1,201 @@
+# basic block translation. Straight line code up to the next jump is compiled into one
+# python function with the registers as locals, blocks are cached by their start address
+
+from cpu import CPU, FG, FG_ZERO, FG_NOT_ZERO, FG_EQ, FG_NOT_EQ, INSTRUCTION_SIZE, decode
+from memory import MEMORY_END
+
+MAX_BLOCK_LENGTH = 64
+PAGE_SHIFT = 8
+
+# opcode -> (flag tested or None for always, target is a register)
+JUMPS = {
+    0x05: (FG_NOT_ZERO, False), 0x06: (FG_NOT_ZERO, True),
+    0x11: (FG_ZERO, False), 0x12: (FG_ZERO, True),
+    0x18: (None, False), 0x19: (None, True),
+    0x1a: (FG_EQ, False), 0x1b: (FG_EQ, True),
+    0x1c: (FG_NOT_EQ, False), 0x1d: (FG_NOT_EQ, True),
+}
+WTR = (0x15, 0x16)
+WTR_REG = 0x16
+OUT = 0x03
+
+# flag -> condition on the operands (c1, c2) of the last cmp in the block
+CONDITIONS = {FG_ZERO: "c1 == 0", FG_NOT_ZERO: "c1 != 0", FG_EQ: "c1 == c2", FG_NOT_EQ: "c1 != c2"}
+
+# opcode -> statement, {a} is reg1, {b} reg2 and {imm} the imm16
+STATEMENTS = {
+    0x00: "pass",
+    0x01: "{a} = {b}",
+    0x02: "{a} = {imm}",
+    0x03: "output({imm}, {b})",
+    0x04: "{a} = cpu.inputs.get({imm}, 0) & 0xFFFF",
+    0x07: "{a} = {a} + {b} & 0xFFFF",
+    0x08: "{a} = {a} + {imm} & 0xFFFF",
+    0x09: "{a} = {a} - {b} & 0xFFFF",
+    0x0a: "{a} = {a} - {imm} & 0xFFFF",
+    0x0b: "{a} = ~({a} & {b}) & 0xFFFF",
+    0x0c: "{a} = ~({a} & {imm}) & 0xFFFF",
+    0x0d: "{a} = ~({a} | {b}) & 0xFFFF",
+    0x0e: "{a} = ~({a} | {imm}) & 0xFFFF",
+    0x0f: "c1 = {a}; c2 = {b}",
+    0x10: "c1 = {a}; c2 = {imm}",
+    0x13: "{a} = read({imm})",
+    0x14: "{a} = read({b})",
+    0x15: "store({imm}, {a})",
+    0x16: "store({b}, {a})",
+    0x17: "{a} = ({a} & 0xFF) << 8 | {a} >> 8",
+}
+# which of reg1/reg2 every opcode reads and writes
+READS_A = {0x07, 0x08, 0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x0e, 0x0f, 0x10, 0x15, 0x16, 0x17}
+READS_B = {0x01, 0x03, 0x07, 0x09, 0x0b, 0x0d, 0x0f, 0x14, 0x16, 0x06, 0x12, 0x19, 0x1b, 0x1d}
+WRITES_A = {0x01, 0x02, 0x04, 0x07, 0x08, 0x09, 0x0a, 0x0b, 0x0c, 0x0d, 0x0e, 0x13, 0x14, 0x17}
+COMPARES = (0x0f, 0x10)
+
+
+class TranslatingCPU(CPU):
+    def __init__(self, memory=None, inputs=None, **kwargs) -> None:
+        super().__init__(memory, inputs, **kwargs)
+        # address -> (function or None if the block has to be interpreted, instruction count, address of the last instruction)
+        self.blocks = {}
+        # page -> start addresses of the blocks that cover it
+        self.code_pages = {}
+        self.translated = 0
+
+    def store(self, address, value):
+        super().store(address, value)
+        if address >> PAGE_SHIFT in self.code_pages:
+            self.invalidate_pages(address >> PAGE_SHIFT, (address >> PAGE_SHIFT) + 1)
+
+    def invalidate(self, start, stop):
+        super().invalidate(start, stop)
+        self.invalidate_pages(start >> PAGE_SHIFT, (stop + (1 << PAGE_SHIFT) - 1) >> PAGE_SHIFT)
+
+    def invalidate_pages(self, first, last):
+        for page in range(first, last):
+            starts = self.code_pages.pop(page, None)
+            if starts:
+                for start in starts:
+                    self.blocks.pop(start, None)
+
+    def read_block(self, start):
+        # the instructions of the block at start as (address, opcode, reg1, reg2, imm16)
+        instructions = []
+        address = start
+        while True:
+            opcode, r1, r2, imm = decode(self.memory.fetch(address))
+            instructions.append((address, opcode, r1, r2, imm))
+            address += INSTRUCTION_SIZE
+            # a wtr may change the rest of the block and an out to the bank port the mapped code, the dispatcher has
+            # to look again. A wtr to a fixed address outside of the longest possible block can not change it
+            if opcode in JUMPS or (opcode == OUT and imm == self.bank_port):
+                break
+            if opcode in WTR and (opcode == WTR_REG or start <= imm < start + MAX_BLOCK_LENGTH * INSTRUCTION_SIZE):
+                break
+            if len(instructions) == MAX_BLOCK_LENGTH or address >= MEMORY_END:
+                break
+        return instructions
+
+    def generate(self, start, instructions):
+        # python source of the block function, or None if the block can not be translated
+        used = set()
+        written = set()
+        body = []
+        compared = False
+        target = None
+
+        for address, opcode, r1, r2, imm in instructions:
+            a = "r" + str(r1)
+            b = "r" + str(r2)
+            if (r1 == FG and (opcode in READS_A or opcode in WRITES_A)) or (r2 == FG and opcode in READS_B):
+                # the flags are not kept in a local
+                return None
+
+            if opcode in READS_A or opcode in WRITES_A:
+                used.add(r1)
+            if opcode in READS_B:
+                used.add(r2)
+            if opcode in WRITES_A:
+                written.add(r1)
+
+            if opcode in JUMPS:
+                flag, indirect = JUMPS[opcode]
+                destination = b if indirect else str(imm)
+                if flag is None:
+                    target = destination
+                else:
+                    condition = CONDITIONS[flag] if compared else "regs[{}] & {}".format(FG, flag)
+                    target = "{} if {} else {}".format(destination, condition, (address + INSTRUCTION_SIZE) & 0xFFFF)
+            elif opcode in STATEMENTS:
+                body.append(STATEMENTS[opcode].format(a=a, b=b, imm=imm))
+                compared = compared or opcode in COMPARES
+            else:
+                # unknown opcodes do nothing
+                body.append("pass")
+
+        if target is None:
+            target = str((instructions[-1][0] + INSTRUCTION_SIZE) & 0xFFFF)
+
+        lines = ["def make(regs, read, store, output, cpu):", "    def block():"]
+        lines += ["        r{0} = regs[{0}]".format(r) for r in sorted(used)]
+        lines += ["        " + statement for statement in body]
+        lines += ["        regs[{0}] = r{0}".format(r) for r in sorted(written)]
+        if compared:
+            # flags are only materialized once, from the last cmp of the block
+            lines.append("        regs[{}] = ({} if c1 == c2 else {}) | ({} if c1 == 0 else {})".format(FG, FG_EQ, FG_NOT_EQ, FG_ZERO, FG_NOT_ZERO))
+        lines.append("        return " + target)
+        lines.append("    return block")
+        return "\n".join(lines) + "\n"
+
+    def translate(self, start):
+        instructions = self.read_block(start)
+        last = instructions[-1][0]
+        source = self.generate(start, instructions)
+
+        function = None
+        if source is not None:
+            namespace = {}
+            exec(compile(source, "<block 0x{:04x}>".format(start), "exec"), namespace)
+            function = namespace["make"](self.regs, self.memory.read, self.store, self.output, self)
+            self.translated += 1
+
+        block = self.blocks[start] = (function, len(instructions), last)
+        for page in range(start >> PAGE_SHIFT, ((last + INSTRUCTION_SIZE - 1) >> PAGE_SHIFT) + 1):
+            self.code_pages.setdefault(page, set()).add(start)
+        return block
+
+    def run(self, max_steps=1 << 62, end=MEMORY_END):
+        cached = self.blocks.get
+        pc = self.pc
+        steps = 0
+        self.halted = False
+
+        while steps < max_steps:
+            block = cached(pc)
+            if block is None:
+                block = self.translate(pc)
+            function, length, last = block
+
+            if function is None or steps + length > max_steps or last >= end:
+                # interpret, the block can not be translated or would run past a limit
+                self.pc = pc
+                executed = CPU.run(self, min(length, max_steps - steps), end)
+                # counted once for the whole run below
+                self.steps -= executed
+                steps += executed
+                pc = self.pc
+                if self.halted or pc >= end:
+                    break
+                continue
+
+            target = function()
+            steps += length
+            if target == last:
+                # the block ends with a jump to itself
+                self.halted = True
+            pc = target
+            if self.halted or pc >= end:
+                break
+
+        self.pc = pc
+        self.steps += steps
+        return steps
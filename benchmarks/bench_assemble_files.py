@@ -0,0 +1,67 @@
+# files per second when assembling many small firmware variants: one interpreter per file
+# (Assembler/main.py) against Assembler/batch.py in one process, over a process pool and with a
+# cold and a warm image cache
+# usage: python benchmarks/bench_assemble_files.py [--files 200] [--lines 500] [--jobs 4]
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+
+from batch import build_all
+import synth
+
+
+def per_process(paths, output_dir, limit):
+    # only the first limit files, starting an interpreter per file is slow
+    start = time.perf_counter()
+    for path in paths[:limit]:
+        output = os.path.join(output_dir, os.path.basename(path) + ".bin")
+        subprocess.run([sys.executable, os.path.join(ROOT, "Assembler", "main.py"), "--input", path, "--output", output], check=True, stdout=subprocess.DEVNULL)
+    return min(limit, len(paths)), time.perf_counter() - start
+
+
+def batched(paths, output_dir, jobs, cache_dir=None):
+    start = time.perf_counter()
+    results = build_all(paths, output_dir, jobs=jobs, cache_dir=cache_dir)
+    elapsed = time.perf_counter() - start
+    errors = [error for _, _, _, error, _ in results if error is not None]
+    if errors:
+        raise Exception(errors[0])
+    return len(paths), elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--process-limit", type=int, default=50, help="files timed with one interpreter each")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, "variant{:04d}.16bs".format(i))
+            with open(path, "w") as f:
+                f.write(synth.generate(args.lines, seed=i))
+            paths.append(path)
+        output_dir = os.path.join(directory, "out")
+        os.makedirs(output_dir)
+        cache_dir = os.path.join(directory, "cache")
+
+        for name, run in (
+            ("main.py per file", lambda: per_process(paths, output_dir, args.process_limit)),
+            ("batch, 1 process", lambda: batched(paths, output_dir, 1)),
+            ("batch, {} jobs".format(args.jobs), lambda: batched(paths, output_dir, args.jobs)),
+            ("batch, cold cache", lambda: batched(paths, output_dir, 1, cache_dir)),
+            ("batch, warm cache", lambda: batched(paths, output_dir, 1, cache_dir)),
+        ):
+            files, elapsed = run()
+            print("{:<20} {:>5} files {:8.3f}s  {:8.1f} files/s".format(name, files, elapsed, files / elapsed))
@@ -0,0 +1,123 @@
+# instances x instructions per second of the batch emulator against running the scalar
+# emulator once per instance, every instance reads its own seed from port 0. The instances run on
+# both compare their final pc, registers, steps, halt state, ram, bank and out trace, the script
+# exits with 1 if any differs
+# usage: python benchmarks/bench_batch.py [--instances 1000 10000] [--steps 2000]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+sys.path.insert(0, os.path.join(ROOT, "Emulator"))
+
+from bench_emulator import assemble
+from cpu import CPU
+from memory import Memory
+from batch import BatchCPU
+
+# mixes the seed into a ram cell, branches on its bits and reports the result
+SOURCE = """
+start:
+    inp 0, r0
+    lod r2, 0
+loop:
+    add r0, 0x3b
+    swp r0
+    nad r0, 0x7ff7
+    wtr r0, 0x8000
+    ldr r1, 0x8000
+    wtr r2, 0xc123
+    cmp r1, 0
+    jzr skip
+    add r2, r1
+skip:
+    mov sp, r2
+    cmp r0, 0x1234
+    jeq done
+    jmp loop
+done:
+    out 1, r2
+    jmp done
+"""
+
+
+def make_memory(image):
+    memory = Memory()
+    memory.load(image)
+    return memory
+
+
+def run_scalar(image, seeds, steps):
+    start = time.perf_counter()
+    executed = 0
+    cpus = []
+    for seed in seeds:
+        cpu = CPU(make_memory(image), {0: seed})
+        executed += cpu.run(steps)
+        cpus.append(cpu)
+    return executed, time.perf_counter() - start, cpus
+
+
+def run_batch(image, seeds, steps):
+    inputs = np.zeros((len(seeds), 1), dtype=np.uint16)
+    inputs[:, 0] = seeds
+    start = time.perf_counter()
+    cpu = BatchCPU(len(seeds), make_memory(image), inputs)
+    cpu.run(steps)
+    return int(cpu.steps.sum()), time.perf_counter() - start, cpu
+
+
+def differences(batch, cpus):
+    # instances whose state differs between the batch and the scalar cpus, with what differs
+    traces = batch.out_traces()
+    found = []
+    for instance, cpu in enumerate(cpus):
+        fields = []
+        if int(batch.pc[instance]) != cpu.pc:
+            fields.append("pc")
+        if batch.regs[instance].tolist() != cpu.regs:
+            fields.append("registers")
+        if int(batch.steps[instance]) != cpu.steps or bool(batch.halted[instance]) != cpu.halted:
+            fields.append("steps")
+        if bytes(batch.ram[instance]) != bytes(cpu.memory.ram) or int(batch.bank[instance]) != cpu.memory.bank:
+            fields.append("ram")
+        if any(batch.get_bank(instance, number) != cpu.memory.get_bank(number) for number in cpu.memory.used_banks()):
+            fields.append("banks")
+        if traces[instance] != cpu.out_trace:
+            fields.append("out trace")
+        if fields:
+            found.append((instance, fields))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--instances", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--scalar-limit", type=int, default=1000, help="only time this many instances with the scalar emulator and extrapolate")
+
+    args = parser.parse_args()
+    image = assemble(SOURCE)
+
+    failed = False
+    for count in args.instances:
+        seeds = np.random.default_rng(count).integers(0, 0x10000, count, dtype=np.uint16)
+
+        executed, elapsed, batch = run_batch(image, seeds, args.steps)
+        print("{:>6} instances batch  {:>10} instructions {:8.3f}s  {:7.2f} M instance instructions/s".format(count, executed, elapsed, executed / elapsed / 1e6))
+
+        scalar_seeds = seeds[:args.scalar_limit].tolist()
+        executed, elapsed, cpus = run_scalar(image, scalar_seeds, args.steps)
+        print("{:>6} instances scalar {:>10} instructions {:8.3f}s  {:7.2f} M instance instructions/s{}".format(
+            len(scalar_seeds), executed, elapsed, executed / elapsed / 1e6, "" if len(scalar_seeds) == count else " (first {})".format(len(scalar_seeds))))
+
+        for instance, fields in differences(batch, cpus):
+            failed = True
+            print("instance {} (seed {}): different {} than the scalar cpu".format(instance, scalar_seeds[instance], ", ".join(fields)), file=sys.stderr)
+
+    sys.exit(1 if failed else 0)
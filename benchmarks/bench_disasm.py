@@ -0,0 +1,49 @@
+# time of Assembler/disasm.py on full size images: decoding alone, the labelled listing and the
+# round trip check (which assembles the listing again)
+# usage: python benchmarks/bench_disasm.py [--repeat 5]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from assembler import assemble
+from disasm import decode, disassemble, check
+from image import BANK_START, BANK_SIZE, MEMORY_END
+import synth
+
+
+def best(run, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    code = assemble(synth.generate(16000, args.seed))
+    bank = assemble(synth.generate(4000, args.seed), BANK_START, 1)
+    images = (
+        ("64KB code + padding", bytes(code.data) + bytes(MEMORY_END - len(code.data)), 0, sorted((address, name) for name, address in code.symbols.items())),
+        ("64KB random bytes", bytes(rng.randrange(256) for _ in range(MEMORY_END)), 0, []),
+        ("16KB bank", bytes(bank.data) + bytes(BANK_SIZE - len(bank.data)), BANK_START, sorted((address, name) for name, address in bank.symbols.items())),
+    )
+
+    for name, data, origin, symbols in images:
+        decoded, _ = best(lambda: decode(data), args.repeat)
+        listed, lines = best(lambda: disassemble(data, origin, symbols), args.repeat)
+        checked, _ = best(lambda: check(data, origin, lines, symbols), 1)
+        print("{:<20} {:>6} bytes  decode {:7.2f}ms  listing {:7.1f}ms ({} lines)  check {:7.1f}ms".format(
+            name, len(data), decoded * 1000, listed * 1000, len(lines), checked * 1000))
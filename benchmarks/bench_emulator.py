@@ -0,0 +1,92 @@
+# instructions per second of the python emulator on assembled loops
+# usage: python benchmarks/bench_emulator.py [--steps 3000000] [--repeat 3]
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+sys.path.insert(0, os.path.join(ROOT, "Emulator"))
+
+import assembler
+from cpu import CPU
+from memory import Memory
+from translate import TranslatingCPU
+
+PROGRAMS = {}
+
+# copies a byte table into ram, sums it up and counts down r2 forever
+PROGRAMS["memory"] = """
+start:
+    lod r2, 0xffff
+loop:
+    lod r0, 0
+    ldr r1, table
+    wtr r1, 0x8000
+    ldr r1, 0x8000
+    add r0, r1
+    swp r0
+    nad r0, 0x0ff0
+    nor r0, r1
+    mov sp, r0
+    out 0x1, r0
+    sub r2, 1
+    cmp r2, 0
+    jnz loop
+    jmp start
+table:
+    db 1, 2, 3, 4
+"""
+
+# only register operations, long basic blocks
+PROGRAMS["alu"] = """
+start:
+    lod r2, 0xffff
+loop:
+    lod r0, 3
+    add r0, r2
+    swp r0
+    nad r0, 0x0ff0
+    nor r0, r2
+    mov r1, r0
+    add r1, 7
+    sub r1, r0
+    mov sp, r1
+    sub r2, 1
+    cmp r2, 0
+    jnz loop
+    jmp start
+"""
+
+
+def assemble(source):
+    return assembler.assemble(source).data
+
+
+def bench(cpu_class, image, steps, repeat):
+    best = None
+    for _ in range(repeat):
+        memory = Memory()
+        memory.load(image)
+        cpu = cpu_class(memory)
+        start = time.perf_counter()
+        executed = cpu.run(steps)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return executed, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=3000000)
+    parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+
+    for program, source in PROGRAMS.items():
+        image = assemble(source)
+        for name, cpu_class in (("interpreter", CPU), ("translated", TranslatingCPU)):
+            executed, elapsed = bench(cpu_class, image, args.steps, args.repeat)
+            print("{:<7} {:<12} {:>9} instructions {:8.3f}s  {:6.2f} MIPS".format(program, name, executed, elapsed, executed / elapsed / 1e6))
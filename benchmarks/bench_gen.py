@@ -0,0 +1,83 @@
+# times Lexer + Generator on synthetic programs against the two pass generator of an older commit
+# (the baseline by default), loaded from git so the speedup can be measured again. Without git, that
+# commit or the modules its gen.py imports (psutil) only the current generator is timed
+# usage: python benchmarks/bench_gen.py [--lines 10000 100000] [--repeat 3] [--before <commit>]
+
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+import types
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+
+from lexer import Lexer
+from gen import Generator
+import synth
+
+# the last commit with the two pass generator: the parent of the commit that made the generator
+# single pass ("Assemble in a single pass with a forward-reference fixup table"). Point it, or
+# --before, at that commit if the history was rewritten
+TWO_PASS_COMMIT = "17c363aa16992bc0616434fe33a69c8d89978de8"
+
+
+def load_generator(commit):
+    # Assembler/gen.py of commit as a module of its own
+    path = commit + ":Assembler/gen.py"
+    source = subprocess.check_output(["git", "-C", ROOT, "show", path], text=True)
+    module = types.ModuleType("gen_" + commit)
+    exec(compile(source, path, "exec"), module.__dict__)
+    return module
+
+
+def bench(tokens, generate, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        # the generator may print a listing, keep it out of the measurement output
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = generate(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, list(output)
+
+
+def two_pass(module):
+    def generate(tokens):
+        # labels of the old generator are global
+        module.LABELS.clear()
+        return module.Generator(tokens, 0).Gen()
+    return generate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--before", type=str, default=TWO_PASS_COMMIT, help="commit whose generator is compared against")
+
+    args = parser.parse_args()
+
+    try:
+        old = two_pass(load_generator(args.before))
+    except Exception as e:
+        # the old gen.py imports psutil, any failure only leaves out the before column
+        print("before unavailable, can not load Assembler/gen.py of {}: {}".format(args.before, e), file=sys.stderr)
+        old = None
+
+    for lines in args.lines:
+        tokens = Lexer(synth.generate(lines, args.seed)).Lex()
+        after, output = bench(tokens, lambda tokens: Generator(tokens, 0).Gen(), args.repeat)
+        line = "{:>9} lines {:>10} tokens  gen {:8.3f}s  {:>10.0f} lines/s".format(lines, len(tokens), after, lines / after)
+        if old is None:
+            print(line + "  before unavailable")
+            continue
+        before, old_output = bench(tokens, old, args.repeat)
+        if output != old_output:
+            raise Exception("the generator of {} produces different words for {} lines".format(args.before[:7], lines))
+        print(line + "  {} {:8.3f}s  {:5.2f}x faster".format(args.before[:7], before, before / after))
@@ -0,0 +1,70 @@
+# times writing an assembled image: one struct.pack + write per item against the
+# preallocated Image buffer, and print() per byte against the C header writer
+# usage: python benchmarks/bench_image.py [--lines 4000 16000], images have to fit into 64KB
+
+import argparse
+import contextlib
+import io
+import os
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from lexer import StreamLexer
+from gen import Generator
+from image import Image, pack, c_header
+import synth
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def write_per_item(path, values):
+    with open(path, "wb") as f:
+        for i in values:
+            f.write(struct.pack(">I", i))
+
+
+def print_per_byte(data):
+    # the loop bin_to_c_header.py used to run
+    with contextlib.redirect_stdout(io.StringIO()):
+        print('const unsigned char eeprom_content[] = {')
+        for i in range(0, len(data), 16):
+            print('    ', end='')
+            for j in range(i, i+16):
+                if j < len(data):
+                    print('0x{:02x}, '.format(data[j]), end='')
+            print()
+        print('};')
+        print('const unsigned int eeprom_content_len = {};'.format(len(data)))
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[4000, 16000])
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.bin")
+        for lines in args.lines:
+            generator = Generator(StreamLexer(synth.generate(lines, args.seed)).Lex(), 0)
+            generator.Gen()
+            data = pack(generator.final_text, generator.sizes, generator.instruction_counter)
+
+            results = [
+                ("bin per item", timed(lambda: write_per_item(path, generator.final_text))),
+                ("bin image", timed(lambda: Image(0, pack(generator.final_text, generator.sizes, generator.instruction_counter)).write(path))),
+                ("header print", timed(lambda: print_per_byte(data))),
+                ("header image", timed(lambda: c_header(data))),
+            ]
+            for name, elapsed in results:
+                print("{:>9} lines {:>9} bytes  {:<13} {:8.4f}s".format(lines, len(data), name, elapsed))
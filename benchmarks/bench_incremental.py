@@ -0,0 +1,80 @@
+# latency of one edit with Assembler/incremental.py against assembling the whole source again.
+# update() gets the whole source like --watch does, edit() only the changed lines like an editor
+# integration. Edits keep the size of a line, insert an instruction in the middle or insert one
+# near the top, which moves nearly every label
+# usage: python benchmarks/bench_incremental.py [--lines 2000 15000] [--edits 50]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from assembler import assemble
+from incremental import IncrementalAssembler
+import synth
+
+
+# name, where in the source, edit number -> (first, end, texts) replacing lines first to end
+def same_size(i, k):
+    return i, i + 1, ["    lod r1, " + str(k)]
+
+
+def insert(i, k):
+    return i, i, ["    add r0, r1"]
+
+
+EDITS = (("same size", 0.5, same_size), ("insert", 0.5, insert), ("insert at top", 0.01, insert))
+
+
+def bench(lines, at, edit, count, seed):
+    # seconds per edit for (full rebuild, update, edit)
+    texts = synth.generate(lines, seed).split("\n")
+    # an instruction line, so no edit removes a label
+    i = next(i for i in range(int(len(texts) * at), len(texts)) if texts[i].startswith("    lod"))
+    watcher = IncrementalAssembler("\n".join(texts))
+    editor = IncrementalAssembler("\n".join(texts))
+
+    edits = []
+    sources = []
+    for k in range(count):
+        first, end, new = edit(i, k)
+        texts[first:end] = new
+        edits.append((first, end, new))
+        sources.append("\n".join(texts))
+
+    full_count = max(1, count // 10)
+    start = time.perf_counter()
+    for source in sources[:full_count]:
+        assemble(source)
+    full = (time.perf_counter() - start) / full_count
+
+    start = time.perf_counter()
+    for source in sources:
+        watcher.update(source)
+    update = (time.perf_counter() - start) / count
+
+    start = time.perf_counter()
+    for first, end, new in edits:
+        editor.edit(first, end, new)
+    edited = (time.perf_counter() - start) / count
+
+    if watcher.image().data != assemble(sources[-1]).data or editor.image().data != watcher.image().data:
+        raise Exception("incremental image differs from a full build")
+    return full, update, edited
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[2000, 15000])
+    parser.add_argument("--edits", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for lines in args.lines:
+        for name, at, edit in EDITS:
+            full, update, edited = bench(lines, at, edit, args.edits, args.seed)
+            print("{:>6} lines {:<14} full {:9.3f}ms  update {:7.3f}ms  edit {:7.3f}ms  {:6.0f}x".format(
+                lines, name, full * 1000, update * 1000, edited * 1000, full / edited))
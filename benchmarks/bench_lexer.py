@@ -0,0 +1,53 @@
+# compares the lexer engines on synthetic programs and checks that they agree
+# usage: python benchmarks/bench_lexer.py [--lines 10000 100000] [--repeat 3]
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from lexer import LEXERS
+import synth
+
+# edge cases every lexer must agree on: blanks before the end of the text, with no line break after them
+EDGE_CASES = ["start:\n    nop  ", "start: nop\t \t", "nop ; comment \t", " \t"]
+
+
+def bench(engine, source, repeat):
+    best = None
+    tokens = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = LEXERS[engine](source).Lex()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return tokens, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    for source in EDGE_CASES:
+        results = [[(t.type, t.value) for t in LEXERS[engine](source).Lex()] for engine in LEXERS]
+        if any(result != results[0] for result in results):
+            print("token streams differ between lexers for {!r}".format(source))
+            sys.exit(1)
+
+    for lines in args.lines:
+        source = synth.generate(lines, args.seed)
+        results = {}
+        for engine in LEXERS:
+            tokens, elapsed = bench(engine, source, args.repeat)
+            results[engine] = [(t.type, t.value) for t in tokens]
+            print("{:>9} lines  {:<7} {:8.3f}s  {:>10.0f} tokens/s".format(lines, engine, elapsed, len(tokens) / elapsed))
+
+        if len(set(map(tuple, results.values()))) != 1:
+            print("token streams differ between lexers")
+            sys.exit(1)
@@ -0,0 +1,73 @@
+# cost of resetting a machine by restoring a snapshot against building a fresh one, and the
+# memory a cpu on forked memory needs once it ran a little and touched a few pages
+# usage: python benchmarks/bench_snapshot.py [--resets 2000] [--steps 200] [--machines 1000]
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+sys.path.insert(0, os.path.join(ROOT, "Emulator"))
+
+from bench_emulator import PROGRAMS, assemble
+from cpu import CPU
+from memory import Memory
+
+
+def fresh(image, resets, steps):
+    start = time.perf_counter()
+    for _ in range(resets):
+        memory = Memory()
+        memory.load(image)
+        CPU(memory).run(steps)
+    return time.perf_counter() - start
+
+
+def restored(image, resets, steps):
+    start = time.perf_counter()
+    memory = Memory()
+    memory.load(image)
+    cpu = CPU(memory)
+    snapshot = cpu.snapshot()
+    for _ in range(resets):
+        cpu.run(steps)
+        cpu.restore(snapshot)
+    return time.perf_counter() - start
+
+
+def forked(image, machines, steps):
+    # bytes allocated per cpu with forked memory that ran steps instructions and wrote to 3 ram
+    # pages and 1 bank page
+    base = Memory()
+    base.load(image)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = []
+    for i in range(machines):
+        cpu = CPU(base.fork())
+        cpu.run(steps)
+        for address in (0x8000, 0x8100, 0x9000, 0xc000):
+            cpu.store(address, i)
+        keep.append(cpu)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / machines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resets", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--machines", type=int, default=1000)
+
+    args = parser.parse_args()
+    image = assemble(PROGRAMS["memory"])
+
+    elapsed = fresh(image, args.resets, args.steps)
+    print("fresh machine    {:>6} resets {:8.3f}s  {:8.1f} us/reset".format(args.resets, elapsed, elapsed / args.resets * 1e6))
+    elapsed = restored(image, args.resets, args.steps)
+    print("restore snapshot {:>6} resets {:8.3f}s  {:8.1f} us/reset".format(args.resets, elapsed, elapsed / args.resets * 1e6))
+    print("forked machine   {:>6} machines {:8.0f} bytes/machine".format(args.machines, forked(image, args.machines, args.steps)))
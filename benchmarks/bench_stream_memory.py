@@ -0,0 +1,99 @@
+# peak RSS and speed of assembling huge generated sources in full (read, lex, generate, pack) and
+# with Assembler/stream.py. The sources are table heavy with a fixed set of labels, so only the
+# number of lines grows. Images this big do not fit the 64KB address space, the limit is lifted
+# for the measurement. Every run is a fresh interpreter
+# usage: python benchmarks/bench_stream_memory.py [--lines 10000 100000 1000000 10000000] [--full-limit 1000000]
+
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+LABELS = 64
+REGS = ("r0", "r1", "r2")
+
+
+def write_source(path, lines, seed=0):
+    # written in blocks, the source of the biggest runs does not fit in memory comfortably
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        # a forward reference, patched once the first block is written
+        f.write("    jmp body\n")
+        for i in range(LABELS):
+            f.write("t{}:\n    lod r0, {}\n".format(i, i))
+        written = 1 + 2 * LABELS
+        while written < lines:
+            block = []
+            for _ in range(min(10000, lines - written)):
+                kind = rng.randrange(6)
+                if kind == 0:
+                    block.append("    lod " + rng.choice(REGS) + ", " + hex(rng.randrange(0x10000)))
+                elif kind == 1:
+                    block.append("    add " + rng.choice(REGS) + ", " + rng.choice(REGS))
+                elif kind == 2:
+                    block.append("    jnz t" + str(rng.randrange(LABELS)))
+                elif kind == 3:
+                    block.append("    db " + ", ".join(str(rng.randrange(256)) for _ in range(8)))
+                elif kind == 4:
+                    block.append("    dw t" + str(rng.randrange(LABELS)) + ", " + hex(rng.randrange(0x10000)))
+                else:
+                    block.append("; generated table row " + str(written + len(block)))
+            if written == 1 + 2 * LABELS:
+                block.append("body:")
+            f.write("\n".join(block) + "\n")
+            written += len(block)
+
+
+def child(mode, path):
+    output = path + ".bin"
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "full":
+        from lexer import StreamLexer
+        from gen import Generator
+        from image import pack, write_file
+        with open(path, "r") as f:
+            source = f.read()
+        generator = Generator(StreamLexer(source).Lex(), 0)
+        generator.Gen()
+        write_file(output, pack(generator.final_text, generator.sizes, generator.instruction_counter))
+    else:
+        from stream import assemble_stream
+        assemble_stream(path, output, limit=None)
+    elapsed = time.perf_counter() - start
+    print(before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed, os.path.getsize(output))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000, 1000000, 10000000])
+    parser.add_argument("--full-limit", type=int, default=1000000, help="largest source also assembled in full")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--child", type=str, nargs=2, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in args.lines:
+            path = os.path.join(directory, "huge.16bs")
+            write_source(path, lines, args.seed)
+            outputs = []
+            for mode in ("full", "stream"):
+                if mode == "full" and lines > args.full_limit:
+                    continue
+                before, after, elapsed, size = subprocess.check_output([sys.executable, __file__, "--child", mode, path]).split()
+                outputs.append(open(path + ".bin", "rb").read() if lines <= args.full_limit else None)
+                print("{:>9} lines {:<7} peak rss {:>8.1f} MB  (interpreter {:.1f} MB)  {:8.2f}s  {:>9.0f} lines/s  {:>10} bytes".format(
+                    lines, mode, int(after) / 1024, int(before) / 1024, float(elapsed), lines / float(elapsed), int(size)))
+            if len(outputs) == 2 and outputs[0] != outputs[1]:
+                raise Exception("streaming output differs from a full assembly")
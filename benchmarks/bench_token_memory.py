@@ -0,0 +1,60 @@
+# peak RSS of lexing (and generating) a synthetic program with each lexer engine,
+# every measurement runs in a fresh interpreter that only holds the source text
+# usage: python benchmarks/bench_token_memory.py [--lines 100000 1000000] [--gen]
+
+import argparse
+import contextlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from lexer import LEXERS
+import synth
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(engine, path, gen):
+    with open(path, "r") as f:
+        source = f.read()
+    before = peak_rss_kb()
+    tokens = LEXERS[engine](source).Lex()
+    if gen:
+        from gen import Generator
+        with contextlib.redirect_stdout(io.StringIO()):
+            Generator(tokens, 0).Gen()
+    print(before, peak_rss_kb(), len(tokens))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gen", action="store_true", help="also run the generator on the tokens")
+    parser.add_argument("--child", type=str, nargs=2, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.gen)
+        sys.exit(0)
+
+    for lines in args.lines:
+        with tempfile.NamedTemporaryFile("w", suffix=".16bs") as f:
+            f.write(synth.generate(lines, args.seed))
+            f.flush()
+
+            for engine in LEXERS:
+                command = [sys.executable, __file__, "--child", engine, f.name]
+                if args.gen:
+                    command.append("--gen")
+                before, after, token_count = map(int, subprocess.check_output(command).split())
+                print("{:>9} lines {:>10} tokens  {:<7} peak rss {:>8.1f} MB  (reading the source alone: {:.1f} MB)".format(
+                    lines, token_count, engine, after / 1024, before / 1024))
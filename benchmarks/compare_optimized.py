@@ -0,0 +1,129 @@
+# runs optimized and unoptimized images side by side in the emulator and checks they end in the
+# same state (registers, ram and out trace). Also prints the instructions and cycles saved
+# usage: python benchmarks/compare_optimized.py [files.16bs ...] [--programs 200] [--max-steps 100000]
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+sys.path.insert(0, os.path.join(ROOT, "Emulator"))
+
+from lexer import StreamLexer
+from gen import Generator
+import optimize
+from assembler import assemble
+from memory import Memory
+from profiler import ProfilingCPU
+
+REGS = ("r0", "r1", "r2", "sp")
+
+
+def program(rng, blocks=12):
+    # random code that only jumps forward so it always halts, with things for the optimizer to find
+    lines = []
+    for block in range(blocks):
+        lines.append("b{}:".format(block))
+        for _ in range(rng.randrange(1, 8)):
+            reg = rng.choice(REGS)
+            kind = rng.randrange(10)
+            if kind == 0:
+                lines.append("    nop")
+            elif kind == 1:
+                lines.append("    mov {}, {}".format(reg, rng.choice((reg, rng.choice(REGS)))))
+            elif kind == 2:
+                lines.append("    lod {}, {}".format(reg, rng.randrange(0x10000)))
+                lines.append("    {} {}, {}".format(rng.choice(("add", "sub")), reg, rng.randrange(0x10000)))
+            elif kind == 3:
+                lines.append("    {} {}, {}".format(rng.choice(("add", "sub", "nad", "nor")), reg, rng.choice(REGS + (str(rng.randrange(0x10000)),))))
+            elif kind == 4:
+                lines.append("    wtr {}, {}".format(reg, 0x8000 + rng.randrange(16)))
+            elif kind == 5:
+                lines.append("    ldr {}, {}".format(reg, 0x8000 + rng.randrange(16)))
+            elif kind == 6:
+                lines.append("    swp {}".format(reg))
+            else:
+                lines.append("    out {}, {}".format(rng.randrange(3), reg))
+
+        later = "b{}".format(rng.randrange(block + 1, blocks + 1)) if block + 1 < blocks else "end"
+        kind = rng.randrange(5)
+        if kind == 0:
+            lines.append("    jmp " + later)
+            # never executed
+            lines.append("    lod r0, 1")
+            lines.append("    out 0, r0")
+        elif kind == 1:
+            lines.append("    cmp {}, {}".format(rng.choice(REGS), rng.randrange(4)))
+            lines.append("    {} {}".format(rng.choice(("jnz", "jzr", "jeq", "jnq")), later))
+        elif kind == 2:
+            # a trampoline that threading can skip
+            lines.append("    jmp t{}".format(block))
+            lines.append("t{}:".format(block))
+            lines.append("    jmp " + later)
+        elif kind == 3:
+            lines.append("    jmp b{}".format(block + 1))
+    lines.append("b{}:".format(blocks))
+    lines.append("end:")
+    lines.append("    jmp end")
+    return "\n".join(lines) + "\n"
+
+
+def sizes(source):
+    # the (instructions, bytes) before and after optimizing, like generator.optimized
+    statements = Generator(StreamLexer(source).Lex(), 0).Parse()
+    return optimize.size(statements), optimize.size(optimize.optimize(statements))
+
+
+def run(image, max_steps):
+    memory = Memory()
+    memory.load(image)
+    cpu = ProfilingCPU(memory, {0: 0x1234, 1: 0, 2: 0xffff})
+    cpu.run(max_steps)
+    state = ([cpu.regs[i] for i in range(16)], bytes(memory.ram), cpu.out_trace)
+    return state, cpu.halted, cpu.steps, sum(cpu.profile.cycles)
+
+
+def compare(name, source, max_steps):
+    # (equal or None if one of them did not halt, steps, cycles) of both images
+    plain = assemble(source).data
+    optimized = assemble(source, optimize=True).data
+    state, halted, steps, cycles = run(plain, max_steps)
+    optimized_state, optimized_halted, optimized_steps, optimized_cycles = run(optimized, max_steps)
+    equal = state == optimized_state if halted and optimized_halted else None
+    return equal, sizes(source), (steps, optimized_steps), (cycles, optimized_cycles)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--programs", type=int, default=200, help="number of random programs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=100000)
+
+    args = parser.parse_args()
+
+    sources = []
+    for path in args.files:
+        with open(path, "r") as f:
+            sources.append((path, f.read()))
+    rng = random.Random(args.seed)
+    sources += [("random {}".format(i), program(rng)) for i in range(args.programs)]
+
+    failed = 0
+    totals = [0, 0, 0, 0]
+    for name, source in sources:
+        equal, ((instructions, size), (optimized_instructions, optimized_size)), steps, cycles = compare(name, source, args.max_steps)
+        if equal is False:
+            failed += 1
+            print("{}: different state after optimizing".format(name))
+        if args.files and not name.startswith("random"):
+            print("{}: {} -> {} instructions, {} -> {} bytes, {} -> {} executed, {} -> {} cycles{}".format(
+                name, instructions, optimized_instructions, size, optimized_size, *steps, *cycles, "" if equal is not None else " (did not halt, state not compared)"))
+        for i, value in enumerate(steps + cycles):
+            totals[i] += value
+
+    print("{} programs, {} different. executed {} -> {} instructions, {} -> {} cycles ({:.1f}% saved)".format(
+        len(sources), failed, *totals, (totals[2] - totals[3]) * 100 / max(totals[2], 1)))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,108 @@
+# runs seeded random programs on the interpreter (CPU) and the block translator (TranslatingCPU)
+# and checks they end in the same state: pc, registers, out trace, halt state, steps, ram and
+# bank. Programs placed in ram overwrite their own code, out to port 3 switches banks and runs are
+# split by max_steps and end limits and restored from a snapshot once. Exits with 1 on a mismatch
+# usage: python benchmarks/compare_translated.py [--programs 1000] [--seed 0]
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Assembler"))
+sys.path.insert(0, os.path.join(ROOT, "Emulator"))
+
+from assembler import assemble
+from cpu import CPU
+from memory import Memory, RAM_START, BANK_START, MEMORY_END
+from translate import TranslatingCPU
+
+REGS = ("r0", "r1", "r2", "sp")
+INPUTS = {0: 1, 1: 0, 2: 0xffff, 3: 5}
+# rom, ram (code that overwrites itself) and the bank window
+ORIGINS = (0, RAM_START, BANK_START)
+# the parts of state()
+FIELDS = ("pc", "registers", "out trace", "halted", "steps", "ram", "bank")
+
+
+def program(rng):
+    # random code jumping anywhere, so it may loop forever. wtr goes to the first ram page, over
+    # the code of programs placed there
+    count = rng.randrange(5, 40)
+    lines = []
+    for i in range(count):
+        lines.append("l{}:".format(i))
+        reg = rng.choice(REGS)
+        other = rng.choice(REGS)
+        imm = rng.randrange(0x10000)
+        kind = rng.choice(("mov", "lod", "add", "sub", "nad", "nor", "cmp", "ldr", "wtr", "swp", "jnz", "jzr", "jeq", "jnq", "jmp", "out", "inp", "nop"))
+        if kind == "mov":
+            lines.append("    mov {}, {}".format(reg, other))
+        elif kind == "lod":
+            lines.append("    lod {}, {}".format(reg, imm))
+        elif kind in ("add", "sub", "nad", "nor", "cmp", "ldr"):
+            lines.append("    {} {}, {}".format(kind, reg, rng.choice((other, str(imm)))))
+        elif kind == "wtr":
+            lines.append("    wtr {}, {}".format(reg, rng.choice((other, str(RAM_START + rng.randrange(0x100))))))
+        elif kind == "swp":
+            lines.append("    swp " + reg)
+        elif kind[0] == "j":
+            lines.append("    {} {}".format(kind, "l{}".format(rng.randrange(count)) if rng.random() < 0.8 else reg))
+        elif kind in ("out", "inp"):
+            lines.append("    {} {}, {}".format(kind, rng.randrange(4), reg))
+        else:
+            lines.append("    nop")
+    return "\n".join(lines) + "\n"
+
+
+def state(cpu):
+    return (cpu.pc, cpu.regs[:], cpu.out_trace[:], cpu.halted, cpu.steps, bytes(cpu.memory.ram), cpu.memory.bank)
+
+
+def run(cpu_class, image, origin, steps, end, rewind):
+    # the states after every part of the run. The cpu is reset to a snapshot after rewind steps
+    # and runs the rest again
+    memory = Memory()
+    memory.load(image, origin)
+    cpu = cpu_class(memory, dict(INPUTS))
+    cpu.pc = origin
+    cpu.run(rewind, end)
+    snapshot = cpu.snapshot()
+    states = [state(cpu)]
+    for _ in range(2):
+        for _ in range(3):
+            cpu.run(steps // 3 + 1, end)
+            states.append(state(cpu))
+        cpu.restore(snapshot)
+        states.append(state(cpu))
+    return states
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--programs", type=int, default=1000, help="number of random programs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-steps", type=int, default=3000)
+
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failed = 0
+    for i in range(args.programs):
+        source = program(rng)
+        origin = rng.choice(ORIGINS)
+        image = assemble(source, origin).data
+        steps = rng.randrange(1, args.max_steps)
+        end = rng.choice((MEMORY_END, origin + 0x30))
+        rewind = rng.randrange(50)
+        expected = run(CPU, image, origin, steps, end, rewind)
+        translated = run(TranslatingCPU, image, origin, steps, end, rewind)
+        if expected != translated:
+            failed += 1
+            part = next(j for j in range(len(expected)) if expected[j] != translated[j])
+            fields = [name for name, a, b in zip(FIELDS, expected[part], translated[part]) if a != b]
+            print("random {} at 0x{:04x}: different {} after part {} of the run".format(i, origin, ", ".join(fields), part))
+
+    print("{} programs, {} different".format(args.programs, failed))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,203 @@
+# regression suite for the assembler. Times lexing, generation and writing the image in every
+# format separately on synth.program() sources of several sizes, measures the peak memory of each
+# phase with tracemalloc. Exits with 1 if a peak grew more than allowed or the token or image
+# sizes changed against benchmarks/baseline.json, these do not depend on the machine. Timings do,
+# they are compared against a baseline recorded on this machine (--update-baseline writes both)
+# and only reported unless --strict-time is given
+# usage: python benchmarks/suite.py [--lines 1000 4000 10000] [--repeat 5] [--update-baseline] [--strict-time]
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Assembler"))
+
+from lexer import StreamLexer
+from gen import Generator
+from image import Image, FORMATS
+import synth
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# timings of this machine, not committed
+TIME_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "times.local.json")
+# values that are the same on every machine, the only ones in baseline.json
+DETERMINISTIC = ("peak_bytes", "tokens", "bytes")
+
+
+def lex(source):
+    return StreamLexer(source).Lex()
+
+
+def generate(tokens):
+    generator = Generator(tokens, 0)
+    generator.Gen()
+    return generator
+
+
+def write(generator, directory):
+    image = Image.from_generator(generator)
+    for format in FORMATS:
+        image.write(os.path.join(directory, "image." + format), format)
+    return image
+
+
+def timed(run, repeat, min_time=0.2):
+    # best time of at least repeat runs and the result of the last one. Small inputs run until
+    # min_time passed, the best of a few runs of a millisecond is mostly noise
+    best = None
+    runs = 0
+    total = 0
+    while runs < repeat or total < min_time:
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        runs += 1
+        total += elapsed
+    return best, result
+
+
+def peak(run):
+    # bytes allocated at the peak of run, tracemalloc slows things down so it is a run of its own
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(lines, seed, repeat, directory):
+    # phase -> {seconds, lines/s, peak bytes}
+    source = synth.program(lines, seed)
+    lex_time, tokens = timed(lambda: lex(source), repeat)
+    gen_time, generator = timed(lambda: generate(tokens), repeat)
+    write_time, image = timed(lambda: write(generator, directory), repeat)
+
+    results = {}
+    for phase, seconds, run in (
+        ("lex", lex_time, lambda: lex(source)),
+        ("gen", gen_time, lambda: generate(tokens)),
+        ("write", write_time, lambda: write(generator, directory)),
+    ):
+        results[phase] = {"seconds": seconds, "lines_per_second": lines / seconds, "peak_bytes": peak(run)}
+    results["lex"]["tokens"] = len(tokens)
+    results["write"]["bytes"] = len(image.data)
+    return results
+
+
+def median(runs):
+    # the median of every value over several measure() results
+    return {phase: {key: sorted(run[phase][key] for run in runs)[len(runs) // 2] for key in runs[0][phase]} for phase in runs[0]}
+
+
+def select(results, keys):
+    # only keys of every phase
+    return {size: {phase: {key: result[key] for key in keys if key in result} for phase, result in phases.items()} for size, phases in results.items()}
+
+
+def compare(results, baseline, memory_tolerance):
+    # the regressions of results against the deterministic baseline as messages
+    regressions = []
+    for size, phases in results.items():
+        for phase, result in phases.items():
+            base = baseline.get(size, {}).get(phase)
+            if base is None:
+                continue
+            if result["peak_bytes"] > base["peak_bytes"] * (1 + memory_tolerance):
+                regressions.append("{} lines {}: peak {} bytes against {} in the baseline".format(size, phase, result["peak_bytes"], base["peak_bytes"]))
+            for key in ("tokens", "bytes"):
+                if key in base and result[key] != base[key]:
+                    regressions.append("{} lines {}: {} {} against {} in the baseline".format(size, phase, result[key], key, base[key]))
+    return regressions
+
+
+def compare_times(results, baseline, time_tolerance, noise=0.002):
+    # the slowdowns of results against a timing baseline as messages. Slowdowns below noise
+    # seconds are timer jitter on the small sizes and never count
+    slowdowns = []
+    for size, phases in results.items():
+        for phase, result in phases.items():
+            base = baseline.get(size, {}).get(phase)
+            if base is None:
+                continue
+            if result["seconds"] > base["seconds"] * (1 + time_tolerance) and result["seconds"] - base["seconds"] > noise:
+                slowdowns.append("{} lines {}: {:.4f}s against {:.4f}s in the baseline".format(size, phase, result["seconds"], base["seconds"]))
+    return slowdowns
+
+
+def load(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def store(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 4000, 10000], help="program sizes, every format is written so programs have to fit into the 32KB rom")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=str, default=BASELINE, help="peak memory, token and image sizes")
+    parser.add_argument("--time-baseline", type=str, default=TIME_BASELINE, help="timings recorded on this machine")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline and timing baseline")
+    parser.add_argument("--baseline-runs", type=int, default=3, help="the baseline is the median of this many runs")
+    parser.add_argument("--strict-time", action="store_true", help="fail on slowdowns against the timing baseline instead of only reporting them")
+    parser.add_argument("--time-tolerance", type=float, default=0.5, help="allowed slowdown, 0.5 is 50%% slower. Lower it on a quiet machine")
+    parser.add_argument("--memory-tolerance", type=float, default=0.10, help="allowed growth of the peak memory")
+    parser.add_argument("--json", type=str, help="also write the results to this file")
+
+    args = parser.parse_args()
+
+    baseline = {} if args.update_baseline else load(args.baseline)
+    times = {} if args.update_baseline else load(args.time_baseline)
+    if args.strict_time and not times and not args.update_baseline:
+        print("no timing baseline at {}, record one on this machine with --update-baseline first".format(args.time_baseline), file=sys.stderr)
+        sys.exit(1)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for lines in args.lines:
+            runs = [measure(lines, args.seed, args.repeat, directory) for _ in range(args.baseline_runs if args.update_baseline else 1)]
+            results[str(lines)] = phases = median(runs)
+            for phase, result in phases.items():
+                base = baseline.get(str(lines), {}).get(phase)
+                base_time = times.get(str(lines), {}).get(phase)
+                change = (" {:+6.1f}% time".format(100 * (result["seconds"] / base_time["seconds"] - 1)) if base_time else "") + \
+                    (" {:+6.1f}% memory".format(100 * (result["peak_bytes"] / base["peak_bytes"] - 1)) if base else "")
+                print("{:>6} lines {:<6} {:9.4f}s {:>10.0f} lines/s  peak {:8.1f} KB{}".format(
+                    lines, phase, result["seconds"], result["lines_per_second"], result["peak_bytes"] / 1024, change))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        store(args.baseline, select(results, DETERMINISTIC))
+        store(args.time_baseline, select(results, ("seconds", "lines_per_second")))
+        print("baseline written to {}, timings to {}".format(args.baseline, args.time_baseline))
+        sys.exit(0)
+
+    if not baseline:
+        print("no baseline at {}, run with --update-baseline first".format(args.baseline))
+
+    regressions = compare(results, baseline, args.memory_tolerance)
+    slowdowns = compare_times(results, times, args.time_tolerance)
+    if args.strict_time:
+        regressions += slowdowns
+    else:
+        for slowdown in slowdowns:
+            print("slower (not checked without --strict-time): " + slowdown)
+    for regression in regressions:
+        print("regression: " + regression, file=sys.stderr)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,106 @@
+# seeded generator for large synthetic .16bs programs
+
+import random
+
+from isa import INSTRUCTIONS, REGISTERS
+
+REGS = ("r0", "r1", "r2")
+
+
+def generate(lines, seed=0):
+    rng = random.Random(seed)
+    labels = ["l" + str(i) for i in range(max(1, lines // 8))]
+    # every line is at most 4 bytes, only reference labels that stay addressable with an imm16
+    reachable = labels[:0x10000 // (4 * 8)]
+    out = []
+    next_label = 0
+
+    for i in range(lines):
+        if i % 8 == 0 and next_label < len(labels):
+            out.append(labels[next_label] + ":")
+            next_label += 1
+            continue
+
+        reg = rng.choice(REGS)
+        kind = rng.randrange(4)
+        if kind == 0:
+            out.append("    lod " + reg + ", " + hex(rng.randrange(0x10000)))
+        elif kind == 1:
+            out.append("    add " + reg + ", " + rng.choice(REGS))
+        elif kind == 2:
+            out.append("    cmp " + reg + ", " + str(rng.randrange(0x10000)))
+        else:
+            # forward and backward references
+            out.append("    jnz " + rng.choice(reachable))
+
+    return "\n".join(out) + "\n"
+
+
+# operands of program(): port numbers, immediates in every notation the lexer knows
+def number(rng):
+    value = rng.randrange(0x10000)
+    return rng.choice((str(value), hex(value), bin(value & 0xFF)))
+
+
+def program(lines, seed=0):
+    # a program that looks like real firmware: every instruction form of the isa, a label every
+    # few lines, references back and ahead, db/dw tables and comments. Has to fit into 64KB
+    rng = random.Random(seed)
+    forms = [(mnemonic, kinds) for mnemonic, signatures in INSTRUCTIONS.items() for kinds in signatures]
+    registers = list(REGISTERS)
+    out = []
+    address = 0
+    defined = 0
+    # highest label number referenced so far, everything up to it gets defined
+    wanted = -1
+
+    def reference():
+        nonlocal wanted
+        if defined and rng.randrange(2):
+            return "l" + str(rng.randrange(max(0, defined - 64), defined))
+        label = defined + rng.randrange(1, 16)
+        wanted = max(wanted, label)
+        return "l" + str(label)
+
+    while len(out) < lines:
+        kind = rng.randrange(20)
+        if kind < 5:
+            out.append("l" + str(defined) + ":")
+            defined += 1
+        elif kind == 5:
+            out.append("; " + rng.choice(("table", "loop", "irq handler", "copy", "todo")) + " " + str(len(out)))
+        elif kind == 6:
+            # a table: a label and a few rows of bytes or words, words can be addresses
+            out.append("l" + str(defined) + ":")
+            defined += 1
+            for _ in range(rng.randrange(1, 6)):
+                if rng.randrange(2):
+                    values = [str(rng.randrange(256)) for _ in range(rng.randrange(1, 12))]
+                    out.append("    db " + ", ".join(values))
+                    address += len(values)
+                else:
+                    values = [reference() if rng.randrange(3) == 0 else hex(rng.randrange(0x10000)) for _ in range(rng.randrange(1, 6))]
+                    out.append("    dw " + ", ".join(values))
+                    address += 2 * len(values)
+        else:
+            mnemonic, kinds = rng.choice(forms)
+            operands = []
+            for operand in kinds:
+                if operand == "reg":
+                    operands.append(rng.choice(registers))
+                elif mnemonic in ("out", "inp"):
+                    operands.append(str(rng.randrange(8)))
+                elif mnemonic[0] == "j" or mnemonic in ("ldr", "wtr") or rng.randrange(4) == 0:
+                    operands.append(reference())
+                else:
+                    operands.append(number(rng))
+            out.append("    " + mnemonic + (" " + ", ".join(operands) if operands else ""))
+            address += 4
+
+    # the labels referenced ahead that the program did not reach
+    while defined <= wanted:
+        out.append("l" + str(defined) + ":")
+        defined += 1
+    if address > 0x10000:
+        raise Exception("A program of " + str(lines) + " lines has " + str(address) + " bytes and does not fit into 64KB")
+    return "\n".join(out) + "\n"
@@ -1,17 +1,11 @@
 # convert a.bin to a.h
 
+import os
 import sys
-import struct
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Assembler"))
+
+from image import c_header
 
 with open(sys.argv[1], 'rb') as f:
-	data = f.read()
-	print('const unsigned char eeprom_content[] = {')
-	for i in range(0, len(data), 16):
-		print('    ', end='')
-		for j in range(i, i+16):
-			if j < len(data):
-				print('0x{:02x}, '.format(data[j]), end='')
-		print()
-	print('};')
-	print('const unsigned int eeprom_content_len = {};'.format(len(data)))
-	print()
\ No newline at end of file
+	sys.stdout.write(c_header(f.read()))